@@ -1,58 +1,69 @@
 import os
-from datetime import datetime, timedelta
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-import pytz
+import csv
+import json
+import time
+import logging
+import argparse
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
 from dotenv import load_dotenv
+from Majao_Bot_Modules.Common import GoogleClient, TimeUtils
 
 # Load environment variables
 load_dotenv("/Users/chrispasco/Documents/MachineLearning/Majao_Chatbot/.env")
 
 # Constants
-SCOPES = ['https://www.googleapis.com/auth/calendar']
 CREDENTIALS_FILE = '/Users/chrispasco/Documents/MachineLearning/Majao_Chatbot/CalendarMonitor/client_secret.json'
 TOKEN_FILE = '/Users/chrispasco/Documents/MachineLearning/Majao_Chatbot/CalendarMonitor/token.json'
 TEACHER_RATE_COP = int(os.getenv('TEACHER_RATE_COP')) # Payment rate per hour for external teachers
 OWNER_TEACHERS = {'chris', 'sindi'}  # Teachers who don't get paid per hour (case-insensitive)
 
+logger = logging.getLogger(__name__)
+
+# Accumulated wall time and call counts per stage (api / parse / aggregate)
+STAGE_TIMINGS = defaultdict(float)
+STAGE_CALLS = defaultdict(int)
+
+@contextmanager
+def timed(stage):
+    """Add the wall time of the enclosed block to STAGE_TIMINGS[stage]."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_TIMINGS[stage] += time.perf_counter() - start
+        STAGE_CALLS[stage] += 1
+
+def log_timing_summary():
+    """Log where the run spent its time, one line per stage."""
+    total = sum(STAGE_TIMINGS.values())
+    if not total:
+        return
+    logger.info("Timing summary (%.3fs measured):", total)
+    for stage, seconds in sorted(STAGE_TIMINGS.items(), key=lambda item: -item[1]):
+        logger.info("  %-10s %8.3fs  %5.1f%%  (%d calls)", stage, seconds, 100 * seconds / total, STAGE_CALLS[stage])
+
 def get_calendar_service():
-    creds = None
-    if os.path.exists(TOKEN_FILE):
-        print(f"Loading existing token from {TOKEN_FILE}")
-        creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
-    if not creds or not creds.valid:
-        if not os.path.exists(CREDENTIALS_FILE):
-            raise FileNotFoundError(f"Credentials file not found at {CREDENTIALS_FILE}")
-        print(f"No valid creds found, initiating OAuth flow with {CREDENTIALS_FILE}")
-        try:
-            flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS_FILE, SCOPES)
-            flow.redirect_uri = 'http://localhost:8080/'
-            creds = flow.run_local_server(port=8080)
-            print(f"OAuth flow completed, saving new token to {TOKEN_FILE}")
-            with open(TOKEN_FILE, 'w') as token:
-                token.write(creds.to_json())
-        except Exception as e:
-            print(f"OAuth flow failed: {str(e)}")
-            raise
-    print(f"Calendar service initialized with creds: {creds is not None}")
-    return build('calendar', 'v3', credentials=creds)
+    """Shared, cached Google Calendar client for the analytics credentials."""
+    return GoogleClient.get_calendar_service(CREDENTIALS_FILE, TOKEN_FILE, oauth_port=8080)
 
 def get_all_calendars(service):
-    print("Fetching all accessible calendars...")
-    calendar_list = service.calendarList().list().execute()
+    logger.debug("Fetching all accessible calendars...")
+    with timed('api'):
+        calendar_list = service.calendarList().list().execute()
     calendars = calendar_list.get('items', [])
-    print(f"Found {len(calendars)} calendars:")
+    logger.info("Found %d calendars", len(calendars))
     for cal in calendars:
-        print(f" - {cal['summary']} (ID: {cal['id']}, Color: {cal.get('backgroundColor', 'Not set')})")
+        logger.debug(" - %s (ID: %s, Color: %s)", cal['summary'], cal['id'], cal.get('backgroundColor', 'Not set'))
     return calendars
 
 def get_week_range(week_choice):
-    tz = pytz.timezone('America/Bogota')
-    now = datetime.now(tz)
+    now = TimeUtils.now()
     
-    if week_choice == "last":
-        now = now - timedelta(days=7)
+    # "current", "last", or a number of weeks back for multi-period reports
+    weeks_ago = {"current": 0, "last": 1}.get(week_choice, week_choice)
+    now = now - timedelta(days=7 * weeks_ago)
     
     days_to_saturday = (now.weekday() - 5 + 7) % 7
     start_of_week = now - timedelta(days=days_to_saturday)
@@ -62,40 +73,36 @@ def get_week_range(week_choice):
     return start_of_week, end_of_week
 
 def get_week_events(service, calendar_id, calendar_name, start_of_week, end_of_week):
-    start_utc = start_of_week.astimezone(pytz.UTC).isoformat()
-    end_utc = end_of_week.astimezone(pytz.UTC).isoformat()
+    start_utc = start_of_week.astimezone(TimeUtils.UTC).isoformat()
+    end_utc = end_of_week.astimezone(TimeUtils.UTC).isoformat()
     
-    print(f"Fetching events from '{calendar_name}' (ID: {calendar_id}) from {start_of_week.strftime('%Y-%m-%d %H:%M')} to {end_of_week.strftime('%Y-%m-%d %H:%M')} Bogota time")
+    logger.debug("Fetching events from '%s' (ID: %s) from %s to %s Bogota time",
+                 calendar_name, calendar_id, start_of_week.strftime('%Y-%m-%d %H:%M'), end_of_week.strftime('%Y-%m-%d %H:%M'))
     
     try:
-        events_result = service.events().list(
-            calendarId=calendar_id,
-            timeMin=start_utc,
-            timeMax=end_utc,
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute()
+        with timed('api'):
+            events_result = service.events().list(
+                calendarId=calendar_id,
+                timeMin=start_utc,
+                timeMax=end_utc,
+                singleEvents=True,
+                orderBy='startTime'
+            ).execute()
         events = events_result.get('items', [])
-        print(f"Successfully fetched {len(events)} events from '{calendar_name}'")
+        logger.info("Fetched %d events from '%s'", len(events), calendar_name)
         return [(event, calendar_name) for event in events]
     except Exception as e:
-        print(f"Error fetching events from '{calendar_name}': {str(e)}")
+        logger.error("Error fetching events from '%s': %s", calendar_name, e)
         return []
 
 def calculate_event_duration(event):
-    start_str = event['start'].get('dateTime', event['start'].get('date'))
-    end_str = event['end'].get('dateTime', event['end'].get('date'))
-    
-    if 'date' in event['start']:
-        print(f"Skipping all-day event: {event.get('summary', 'Untitled')}")
+    times = TimeUtils.parse_event(event)
+    if times is None:
+        logger.debug("Skipping all-day event: %s", event.get('summary', 'Untitled'))
         return 0
     
-    start = datetime.fromisoformat(start_str.replace('Z', '+00:00'))
-    end = datetime.fromisoformat(end_str.replace('Z', '+00:00'))
-    
-    duration = end - start
-    hours = duration.total_seconds() / 3600
-    print(f"Event '{event.get('summary', 'Untitled')}' duration: {hours:.2f} hours")
+    hours = (times.end_ts - times.start_ts) / 3600
+    logger.debug("Event '%s' duration: %.2f hours", event.get('summary', 'Untitled'), hours)
     return hours
 
 def analyze_events(events_with_cal, is_majao):
@@ -103,12 +110,20 @@ def analyze_events(events_with_cal, is_majao):
     total_classes = 0
     teacher_hours = {}
     teacher_payments = {}  # Track payments for external teachers
+    studio = 'MAJAO' if is_majao else 'Casa Ritmo Laureles'
+    debug = logger.isEnabledFor(logging.DEBUG)
+    parse_seconds = 0.0
+    skipped_titles = 0
+    analysis_start = time.perf_counter()
     
     for event, cal_name in events_with_cal:
         title = event.get('summary', 'Untitled')
-        print(f"Processing event from {cal_name} ({'MAJAO' if is_majao else 'Casa Ritmo Laureles'}): {title}")
+        if debug:
+            logger.debug("Processing event from %s (%s): %s", cal_name, studio, title)
         
+        parse_start = time.perf_counter()
         duration = calculate_event_duration(event)
+        parse_seconds += time.perf_counter() - parse_start
         if duration == 0:
             continue
         
@@ -172,7 +187,8 @@ def analyze_events(events_with_cal, is_majao):
             else:
                 teachers = [teacher_part.split(' ', 1)[0].strip()]
         else:
-            print(f"Skipping unparseable title in {cal_name} ({'MAJAO' if is_majao else 'Casa Ritmo Laureles'}): {title}")
+            logger.debug("Skipping unparseable title in %s (%s): %s", cal_name, studio, title)
+            skipped_titles += 1
             continue
         
         if is_majao:
@@ -185,6 +201,16 @@ def analyze_events(events_with_cal, is_majao):
                     payment = duration * TEACHER_RATE_COP
                     teacher_payments[teacher] = teacher_payments.get(teacher, 0) + payment
     
+    if skipped_titles:
+        logger.info("Skipped %d %s events with unparseable titles", skipped_titles, studio)
+    
+    # Per-event timers would cost more than the work they measure, so the
+    # loop is timed once and split into parse vs. aggregation afterwards.
+    STAGE_TIMINGS['parse'] += parse_seconds
+    STAGE_TIMINGS['aggregate'] += time.perf_counter() - analysis_start - parse_seconds
+    STAGE_CALLS['parse'] += len(events_with_cal)
+    STAGE_CALLS['aggregate'] += 1
+    
     return total_hours, total_classes, teacher_hours, teacher_payments
 
 def print_analysis(start_date, casa_ritmo_hours, casa_ritmo_classes, majao_hours, majao_classes, majao_teacher_hours, majao_teacher_payments):
@@ -239,10 +265,112 @@ def print_analysis(start_date, casa_ritmo_hours, casa_ritmo_classes, majao_hours
             print(f"│  No external teacher payments due      │")
             print(f"└────────────────────────────────────────┘")
 
+# Columns shared by every export format and the payroll ledger. Studio total
+# rows leave `teacher` empty; teacher rows leave `classes` empty.
+EXPORT_FIELDS = ['period_start', 'period_end', 'studio', 'teacher', 'classes', 'hours', 'rate_cop', 'payment_cop']
+
+def iter_report_rows(start_date, end_date, studio, total_hours, total_classes, teacher_hours, teacher_payments):
+    """Yield one studio total row and one row per teacher for a period."""
+    period_start = start_date.strftime('%Y-%m-%d')
+    period_end = end_date.strftime('%Y-%m-%d')
+    yield {
+        'period_start': period_start, 'period_end': period_end, 'studio': studio, 'teacher': None,
+        'classes': total_classes, 'hours': round(total_hours, 2), 'rate_cop': None, 'payment_cop': None,
+    }
+    for teacher, hours in sorted(teacher_hours.items()):
+        paid = teacher.lower() not in OWNER_TEACHERS
+        yield {
+            'period_start': period_start, 'period_end': period_end, 'studio': studio, 'teacher': teacher,
+            'classes': None, 'hours': round(hours, 2),
+            'rate_cop': TEACHER_RATE_COP if paid else 0,
+            'payment_cop': round(teacher_payments.get(teacher, 0)) if paid else 0,
+        }
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet export requires pyarrow (pip install pyarrow)")
+    return pyarrow
+
+class CsvReportWriter:
+    """Stream report rows to a CSV file, appending if `append` is set."""
+
+    def __init__(self, path, append=False):
+        write_header = not (append and os.path.exists(path) and os.path.getsize(path) > 0)
+        self.file = open(path, 'a' if append else 'w', newline='')
+        self.writer = csv.DictWriter(self.file, fieldnames=EXPORT_FIELDS)
+        if write_header:
+            self.writer.writeheader()
+
+    def write_rows(self, rows):
+        self.writer.writerows(rows)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class JsonReportWriter:
+    """Stream report rows to a JSON Lines file (one object per line)."""
+
+    def __init__(self, path, append=False):
+        self.file = open(path, 'a' if append else 'w')
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.file.write(json.dumps(row, ensure_ascii=False) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class ParquetReportWriter:
+    """Stream report rows to a Parquet file, one row group per period."""
+
+    def __init__(self, path, append=False):
+        if append:
+            raise ValueError("Parquet files can't be appended to; use --ledger for a running ledger")
+        pa = _import_pyarrow()
+        self.pa = pa
+        self.schema = pa.schema([
+            ('period_start', pa.string()), ('period_end', pa.string()), ('studio', pa.string()),
+            ('teacher', pa.string()), ('classes', pa.int64()), ('hours', pa.float64()),
+            ('rate_cop', pa.int64()), ('payment_cop', pa.int64()),
+        ])
+        self.writer = pa.parquet.ParquetWriter(path, self.schema)
+
+    def write_rows(self, rows):
+        rows = list(rows)
+        if rows:
+            self.writer.write_table(self.pa.Table.from_pylist(rows, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+REPORT_WRITERS = {'csv': CsvReportWriter, 'json': JsonReportWriter, 'parquet': ParquetReportWriter}
+
+def append_to_ledger(ledger_dir, rows):
+    """Write a period's rows into a Parquet ledger directory.
+
+    Each period gets its own file named after its start date, so re-running a
+    week replaces that week instead of double-counting it. The directory can be
+    read as a single table (e.g. pyarrow.dataset or DuckDB's read_parquet).
+    """
+    rows = list(rows)
+    if not rows:
+        return None
+    os.makedirs(ledger_dir, exist_ok=True)
+    path = os.path.join(ledger_dir, f"period_{rows[0]['period_start']}.parquet")
+    writer = ParquetReportWriter(path)
+    try:
+        writer.write_rows(rows)
+    finally:
+        writer.close()
+    logger.info("Ledger updated: %s", path)
+    return path
+
 def get_week_choice():
-    tz = pytz.timezone('America/Bogota')
-    now = datetime.now(tz)
-    
     # Calculate date ranges for display
     current_start, current_end = get_week_range("current")
     last_start, last_end = get_week_range("last")
@@ -260,11 +388,61 @@ def get_week_choice():
         else:
             print("Invalid choice. Please enter 1 or 2.")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Weekly class hours and teacher payments report")
+    verbosity = parser.add_mutually_exclusive_group()
+    verbosity.add_argument('-q', '--quiet', action='store_true', help="only log warnings and errors")
+    verbosity.add_argument('-v', '--verbose', action='store_true', help="log every calendar and event")
+    parser.add_argument('--week', choices=['current', 'last'], help="skip the prompt and report this week")
+    parser.add_argument('--weeks', type=int, default=1, help="number of consecutive weeks to report, ending with --week")
+    parser.add_argument('--export', choices=sorted(REPORT_WRITERS), help="also write the results in this format")
+    parser.add_argument('--output', help="export file path (default: teacher_hours.<format>)")
+    parser.add_argument('--append', action='store_true', help="append to the export file instead of replacing it")
+    parser.add_argument('--ledger', help="Parquet ledger directory to add each reported week to")
+    return parser.parse_args()
+
+def report_week(service, calendars, start_of_week, end_of_week):
+    """Fetch, analyze and print one week; return its export rows."""
+    # Split into MAJAO and Casa Ritmo Laureles
+    majao_events = []
+    casa_ritmo_events = []
+    
+    for cal in calendars:
+        events = get_week_events(service, cal['id'], cal['summary'], start_of_week, end_of_week)
+        if cal['summary'].lower() == 'majao':
+            majao_events.extend(events)
+        else:
+            casa_ritmo_events.extend(events)
+            
+    # Analyze events
+    majao_hours, majao_classes, majao_teacher_hours, majao_teacher_payments = analyze_events(majao_events, True) if majao_events else (0, 0, {}, {})
+    casa_ritmo_hours, casa_ritmo_classes, _, _ = analyze_events(casa_ritmo_events, False) if casa_ritmo_events else (0, 0, {}, {})
+    
+    # Print results
+    print_analysis(start_of_week, casa_ritmo_hours, casa_ritmo_classes, majao_hours, majao_classes, majao_teacher_hours, majao_teacher_payments)
+    
+    if not majao_events and any(cal['summary'].lower() == 'majao' for cal in calendars):
+        logger.warning("MAJAO calendar found but no events fetched!")
+    elif not any(cal['summary'].lower() == 'majao' for cal in calendars):
+        logger.warning("MAJAO calendar not found!")
+    
+    rows = list(iter_report_rows(start_of_week, end_of_week, 'MAJAO', majao_hours, majao_classes, majao_teacher_hours, majao_teacher_payments))
+    rows.extend(iter_report_rows(start_of_week, end_of_week, 'Casa Ritmo Laureles', casa_ritmo_hours, casa_ritmo_classes, {}, {}))
+    return rows
+
 if __name__ == "__main__":
-    print("Starting Calendar Analysis...")
+    args = parse_args()
+    level = logging.WARNING if args.quiet else logging.DEBUG if args.verbose else logging.INFO
+    logging.basicConfig(level=level, format='%(asctime)s %(levelname)s %(message)s')
+    logger.info("Starting Calendar Analysis...")
+    export_writer = None
     try:
         # Get user's week choice
-        week_choice = get_week_choice()
+        week_choice = args.week or get_week_choice()
+        
+        if args.export:
+            output = args.output or f"teacher_hours.{args.export}"
+            export_writer = REPORT_WRITERS[args.export](output, append=args.append)
         
         # Get calendar service
         service = get_calendar_service()
@@ -272,31 +450,24 @@ if __name__ == "__main__":
         # Get all calendars
         calendars = get_all_calendars(service)
         
-        # Get the date range for selected week
-        start_of_week, end_of_week = get_week_range(week_choice)
-        
-        # Split into MAJAO and Casa Ritmo Laureles
-        majao_events = []
-        casa_ritmo_events = []
-        
-        for cal in calendars:
-            events = get_week_events(service, cal['id'], cal['summary'], start_of_week, end_of_week)
-            if cal['summary'].lower() == 'majao':
-                majao_events.extend(events)
-            else:
-                casa_ritmo_events.extend(events)
-                
-        # Analyze events
-        majao_hours, majao_classes, majao_teacher_hours, majao_teacher_payments = analyze_events(majao_events, True) if majao_events else (0, 0, {}, {})
-        casa_ritmo_hours, casa_ritmo_classes, _, _ = analyze_events(casa_ritmo_events, False) if casa_ritmo_events else (0, 0, {}, {})
-        
-        # Print results
-        print_analysis(start_of_week, casa_ritmo_hours, casa_ritmo_classes, majao_hours, majao_classes, majao_teacher_hours, majao_teacher_payments)
+        # Oldest week first, so exports and the ledger read chronologically
+        last_weeks_ago = {"current": 0, "last": 1}[week_choice]
+        for weeks_ago in range(last_weeks_ago + args.weeks - 1, last_weeks_ago - 1, -1):
+            # Get the date range for selected week
+            start_of_week, end_of_week = get_week_range(weeks_ago)
+            rows = report_week(service, calendars, start_of_week, end_of_week)
+            
+            if export_writer:
+                export_writer.write_rows(rows)
+            if args.ledger:
+                append_to_ledger(args.ledger, rows)
         
-        if not majao_events and any(cal['summary'].lower() == 'majao' for cal in calendars):
-            print("Warning: MAJAO calendar found but no events fetched!")
-        elif not any(cal['summary'].lower() == 'majao' for cal in calendars):
-            print("Warning: MAJAO calendar not found!")
+        if export_writer:
+            logger.info("Exported %s report to %s", args.export, output)
+        log_timing_summary()
             
     except Exception as e:
-        print(f"Script failed: {str(e)}")
\ No newline at end of file
+        logger.error("Script failed: %s", e)
+    finally:
+        if export_writer:
+            export_writer.close()
@@ -1,13 +1,13 @@
 import os
 import logging
-from datetime import datetime, timedelta
-import pytz
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
+from collections import namedtuple
+from datetime import timedelta
 import uuid
 from typing import Dict
 import time
+from Majao_Bot_Modules.Common import GoogleClient, TimeUtils
+from Majao_Bot_Modules.Common.TimeUtils import IntervalIndex, TZ
+from Majao_Bot_Modules.Booking.Reservations import HoldStore
 
 #Currently Looks at different Calendar ( client_secret) - change to Casa for deployment
 
@@ -16,33 +16,174 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Configuration
-SCOPES = ['https://www.googleapis.com/auth/calendar']
 CREDENTIALS_FILE = 'client_secret.json'
 TOKEN_FILE = 'token.json'
-TZ = pytz.timezone('America/Bogota')
 LOCATION = "Majao Studio Medellin, Carrera 43A #1-50, Medellín, Colombia"
 OPEN_TIME = 8  # 8:00 AM
 CLOSE_TIME = 17.5  # 5:30 PM
 
-def get_calendar_service():
-    """Initialize Google Calendar service with Bogotá timezone."""
-    creds = None
-    if os.path.exists(TOKEN_FILE):
-        creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
-    if not creds or not creds.valid:
-        flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS_FILE, SCOPES)
-        creds = flow.run_local_server(port=0)
-        with open(TOKEN_FILE, 'w') as token:
-            token.write(creds.to_json())
-    return build('calendar', 'v3', credentials=creds)
-
-def check_availability(start_time: str, length: int, style: str, date_str: str = None) -> Dict:
-    """Check availability with all times in Bogotá timezone."""
-    today = datetime.now(TZ)
-    date_str = date_str or today.strftime('%Y-%m-%d')
+def get_calendar_service(interactive=False):
+    """Shared, cached Google Calendar client for the booking credentials.
+
+    Never opens the browser login by default: the chat server calls this from
+    webhook threads, so a missing or revoked token fails fast instead. Run
+    this module from a terminal to log in again.
+    """
+    return GoogleClient.get_calendar_service(CREDENTIALS_FILE, TOKEN_FILE, interactive=interactive)
+
+ROOMS = ['upstairs', 'downstairs']
+
+# Calendars whose events take up a room in the studio (e.g. MAJAO and Casa
+# Ritmo Laureles), as "calendar_id=Label:rooms" entries. `rooms` is how many
+# classes the calendar can hold at once (default 1). Freebusy merges
+# overlapping events inside one calendar, so it can only count one room per
+# calendar: the one-room calendars share a single freebusy query, and
+# multi-room calendars are deliberately not batched into it but listed event
+# by event with events.list (one call each). The default studio setup is one
+# two-room calendar, so it takes the events.list path; giving each room its
+# own calendar turns availability into one freebusy query.
+StudioCalendar = namedtuple("StudioCalendar", ["id", "label", "rooms"])
+
+def parse_studio_calendars(value):
+    calendars = []
+    for entry in (e.strip() for e in value.split(',')):
+        if not entry:
+            continue
+        calendar_id, _, label = entry.partition('=')
+        rooms = 1
+        if ':' in label and label.rpartition(':')[2].isdigit():
+            label, _, rooms = label.rpartition(':')
+        calendars.append(StudioCalendar(calendar_id.strip(), label.strip() or calendar_id.strip(), int(rooms)))
+    return calendars
+
+STUDIO_CALENDARS = parse_studio_calendars(os.getenv('STUDIO_CALENDAR_IDS', f'primary=MAJAO:{len(ROOMS)}'))
+# Time windows where fewer rooms can be booked: (weekday, 'HH:MM', 'HH:MM', rooms).
+# Weekday is Monday=0. Outside these windows every room in ROOMS is bookable.
+CAPACITY_WINDOWS = []
+
+class OccupancyIndex:
+    """Busy intervals merged from every studio calendar, as TimeUtils.EventTime records."""
+
+    def __init__(self, busy=()):
+        self.busy = IntervalIndex(busy)
+
+    def add(self, start, end, source):
+        self.busy.add(TimeUtils.event_time(start, end, source))
+
+    @classmethod
+    def from_freebusy(cls, response, labels=None):
+        """Busy blocks from a freebusy response, labelled by `labels` (calendar ID -> name)."""
+        labels = labels or {}
+        busy = []
+        for calendar_id, info in response.get('calendars', {}).items():
+            for error in info.get('errors', []):
+                logger.warning(f"Freebusy error for calendar {calendar_id}: {error.get('reason')}")
+            source = labels.get(calendar_id, calendar_id)
+            busy.extend(TimeUtils.parse_busy(block, source) for block in info.get('busy', []))
+        return cls(busy)
+
+    def with_holds(self, holds, exclude=None):
+        """Copy of this index with reservation holds counted as busy rooms."""
+        held = [
+            TimeUtils.event_time(start.astimezone(TZ), end.astimezone(TZ), 'pending booking')
+            for hold_id, start, end in holds if hold_id != exclude
+        ]
+        return OccupancyIndex(list(self.busy) + held)
+
+    def conflicts(self, start, end):
+        """Busy intervals overlapping [start, end)."""
+        return self.busy.overlapping(start.timestamp(), end.timestamp())
+
+    def occupancy(self, start, end):
+        """Highest number of rooms in use at any moment within [start, end)."""
+        return self.busy.peak(start.timestamp(), end.timestamp())
+
+def capacity_for(start_dt, end_dt):
+    """Number of rooms bookable for the whole of [start_dt, end_dt)."""
+    capacity = len(ROOMS)
+    for weekday, window_start, window_end, rooms in CAPACITY_WINDOWS:
+        if start_dt.weekday() != weekday:
+            continue
+        w_start = start_dt.replace(hour=int(window_start[:2]), minute=int(window_start[3:5]))
+        w_end = start_dt.replace(hour=int(window_end[:2]), minute=int(window_end[3:5]))
+        if w_start < end_dt and w_end > start_dt:
+            capacity = min(capacity, rooms)
+    return capacity
+
+def business_day(dt):
+    """Opening and closing time on dt's date."""
+    day_start = dt.replace(hour=OPEN_TIME, minute=0, second=0, microsecond=0)
+    day_end = dt.replace(hour=int(CLOSE_TIME), minute=int((CLOSE_TIME % 1) * 60), second=0, microsecond=0)
+    return day_start, day_end
+
+def _freebusy(service, time_min, time_max, calendar_ids):
+    return service.freebusy().query(body={
+        'timeMin': time_min.isoformat(),
+        'timeMax': time_max.isoformat(),
+        'timeZone': 'America/Bogota',
+        'items': [{'id': calendar_id} for calendar_id in calendar_ids]
+    }).execute()
+
+def _list_events(service, calendar_id, time_min, time_max):
+    """Every timed, busy event in [time_min, time_max), following pagination."""
+    events, page_token = [], None
+    while True:
+        result = service.events().list(
+            calendarId=calendar_id,
+            timeMin=time_min.isoformat(),
+            timeMax=time_max.isoformat(),
+            timeZone='America/Bogota',
+            singleEvents=True,
+            maxResults=2500,
+            pageToken=page_token,
+            fields='nextPageToken,items(summary,transparency,start/dateTime,end/dateTime)'
+        ).execute()
+        events.extend(e for e in result.get('items', []) if e.get('transparency') != 'transparent')
+        page_token = result.get('nextPageToken')
+        if not page_token:
+            return events
+
+def query_occupancy(time_min, time_max, calendars=None):
+    """Build an OccupancyIndex for the studio calendars, or for `calendars` (IDs) with one freebusy call.
+
+    Studio calendars that hold several rooms are listed event by event, with
+    each class labelled by its summary; the rest share one freebusy call and
+    are labelled by calendar.
+    """
+    service = get_calendar_service()
+    if calendars is not None:
+        return OccupancyIndex.from_freebusy(_freebusy(service, time_min, time_max, calendars))
+
+    single = {c.id: c.label for c in STUDIO_CALENDARS if c.rooms == 1}
+    index = OccupancyIndex.from_freebusy(_freebusy(service, time_min, time_max, single), single) if single else OccupancyIndex()
+    for calendar in STUDIO_CALENDARS:
+        if calendar.rooms == 1:
+            continue
+        for event in _list_events(service, calendar.id, time_min, time_max):
+            busy = TimeUtils.parse_event(event, event.get('summary') or calendar.label)
+            if busy:
+                index.busy.add(busy)
+    return index
+
+def free_calendars(calendars, start_dt, end_dt):
+    """The calendars in `calendars` with nothing scheduled in [start_dt, end_dt)."""
+    index = query_occupancy(start_dt, end_dt, calendars)
+    busy = {b.source for b in index.conflicts(start_dt, end_dt)}
+    return set(calendars) - busy
+
+def check_availability(start_time: str, length: int, style: str, date_str: str = None,
+                       holds: HoldStore = None, hold_owner: str = None, existing_hold: str = None) -> Dict:
+    """Check availability with all times in Bogotá timezone.
+
+    With `holds`, pending reservations count as booked rooms (except
+    `existing_hold`, the caller's own). With `hold_owner` as well, a free slot
+    is held atomically and its ID returned as "hold_id".
+    """
+    date_str = date_str or TimeUtils.now().strftime('%Y-%m-%d')
+    hold_id = None
     
     try:
-        start_dt = TZ.localize(datetime.strptime(f"{date_str} {start_time}", '%Y-%m-%d %H:%M'))
+        start_dt = TimeUtils.localize(date_str, start_time)
         end_dt = start_dt + timedelta(minutes=length)
         
         # Check business hours
@@ -54,27 +195,32 @@ def check_availability(start_time: str, length: int, style: str, date_str: str =
                 "suggestions": []
             }
 
-        # Check calendar conflicts (all times in Bogotá timezone)
-        service = get_calendar_service()
-        events_result = service.events().list(
-            calendarId='primary',
-            timeMin=start_dt.isoformat(),
-            timeMax=end_dt.isoformat(),
-            timeZone='America/Bogota',
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute()
-        events = events_result.get('items', [])
+        # One freebusy query covers the requested slot and the alternatives
+        day_start, day_end = business_day(start_dt)
+        time_min, time_max = min(day_start, start_dt), max(day_end, end_dt)
+        index = query_occupancy(time_min, time_max)
+        capacity = capacity_for(start_dt, end_dt)
 
-        if len(events) >= 2:
+        if holds is not None and hold_owner:
+            # Re-checked inside the hold table's write lock, so two concurrent
+            # requests can't both take the last room
+            hold_id = holds.acquire(
+                start_dt, end_dt, hold_owner,
+                lambda active: index.with_holds(active, existing_hold).occupancy(start_dt, end_dt) < capacity
+            )
+            is_full = hold_id is None
+        if holds is not None and not hold_id:
+            # Pending bookings count as busy rooms for the conflicts and alternatives
+            index = index.with_holds(holds.active(time_min, time_max), existing_hold)
+        if holds is None or not hold_owner:
+            is_full = index.occupancy(start_dt, end_dt) >= capacity
+
+        if is_full:
             conflict_details = []
-            for event in events[:2]:
-                summary = event.get('summary', 'Unknown class')
-                start = datetime.fromisoformat(event['start']['dateTime']).astimezone(TZ).strftime('%H:%M')
-                end = datetime.fromisoformat(event['end']['dateTime']).astimezone(TZ).strftime('%H:%M')
-                conflict_details.append(f"• {summary} ({start}-{end})")
+            for busy in index.conflicts(start_dt, end_dt):
+                conflict_details.append(f"• {busy.source} ({busy.start.strftime('%H:%M')}-{busy.end.strftime('%H:%M')})")
             
-            suggestions = get_alternative_slots(start_dt, length, date_str)
+            suggestions = get_alternative_slots(start_dt, length, date_str, index)
             
             return {
                 "is_free": False,
@@ -87,28 +233,23 @@ def check_availability(start_time: str, length: int, style: str, date_str: str =
                 "suggestion_text": format_suggestions(suggestions)
             }
         
-        return {"is_free": True, "start": start_dt, "end": end_dt}
+        return {"is_free": True, "start": start_dt, "end": end_dt, "hold_id": hold_id}
     
     except Exception as e:
         logger.error(f"Availability check failed: {e}")
+        if hold_id:
+            # Don't leave the room blocked for the whole TTL by a reply the student never got
+            try:
+                holds.release(hold_id)
+            except Exception as release_error:
+                logger.error(f"Could not release hold {hold_id}: {release_error}")
         return {"is_free": False, "message": "⚠️ Error checking availability", "suggestions": []}
 
-def get_alternative_slots(original_start, length, date_str):
+def get_alternative_slots(original_start, length, date_str, index=None):
     """Find alternative time slots in Bogotá time."""
-    day_start = original_start.replace(hour=OPEN_TIME, minute=0)
-    day_end = original_start.replace(hour=int(CLOSE_TIME), minute=int((CLOSE_TIME % 1) * 60))
-    
-    service = get_calendar_service()
-    events_result = service.events().list(
-        calendarId='primary',
-        timeMin=day_start.isoformat(),
-        timeMax=day_end.isoformat(),
-        timeZone='America/Bogota',
-        singleEvents=True,
-        orderBy='startTime',
-        fields='items(start/dateTime,end/dateTime)'
-    ).execute()
-    day_events = events_result.get('items', [])
+    day_start, day_end = business_day(original_start)
+    if index is None:
+        index = query_occupancy(day_start, day_end)
     
     # Find all available slots
     available_slots = []
@@ -117,13 +258,9 @@ def get_alternative_slots(original_start, length, date_str):
     
     while current_time + slot_duration <= day_end:
         slot_end = current_time + slot_duration
-        overlapping = [
-            e for e in day_events 
-            if datetime.fromisoformat(e['start']['dateTime']).astimezone(TZ) < slot_end
-            and datetime.fromisoformat(e['end']['dateTime']).astimezone(TZ) > current_time
-        ]
+        is_full = index.occupancy(current_time, slot_end) >= capacity_for(current_time, slot_end)
         
-        if len(overlapping) < 2 and current_time != original_start:
+        if not is_full and current_time != original_start:
             available_slots.append({
                 "start": current_time,
                 "end": slot_end
@@ -166,7 +303,7 @@ def schedule_event(start_time: str, length: int, style: str, student: str, teach
                   student_email: str, teacher_email: str, unique_code: str = None, date_str: str = None) -> Dict:
     """Book a class in Bogotá timezone."""
     try:
-        start_dt = TZ.localize(datetime.strptime(f"{date_str or datetime.now(TZ).strftime('%Y-%m-%d')} {start_time}", '%Y-%m-%d %H:%M'))
+        start_dt = TimeUtils.localize(date_str or TimeUtils.now().strftime('%Y-%m-%d'), start_time)
         end_dt = start_dt + timedelta(minutes=length)
         
         event = {
@@ -195,7 +332,8 @@ def schedule_event(start_time: str, length: int, style: str, student: str, teach
 
 if __name__ == "__main__":
     print("Majao Studio Booking System")
-    print(f"Today in Bogotá: {datetime.now(TZ).strftime('%Y-%m-%d %H:%M')}\n")
+    print(f"Today in Bogotá: {TimeUtils.now().strftime('%Y-%m-%d %H:%M')}\n")
+    get_calendar_service(interactive=True)  # Log in now if the saved token is missing or revoked
     
     while True:
         try:
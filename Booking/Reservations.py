@@ -0,0 +1,96 @@
+import sqlite3
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Callable, List, Optional, Tuple
+
+# Short-lived holds on class slots while a booking waits for the teacher.
+# A hold counts as an occupied room in check_availability until it is
+# released, turned into a calendar event, or its TTL runs out.
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_MINUTES = 180
+
+class HoldStore:
+    """SQLite table of slot holds with atomic, capacity-checked acquisition."""
+
+    def __init__(self, db_path: str, ttl_minutes: int = DEFAULT_TTL_MINUTES):
+        self.ttl_seconds = ttl_minutes * 60
+        # Autocommit mode so transactions are opened explicitly with BEGIN IMMEDIATE,
+        # which takes SQLite's write lock up front and serialises acquisitions
+        # across threads and processes sharing the file.
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=10)
+        self.lock = threading.Lock()
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS booking_holds (
+                hold_id TEXT PRIMARY KEY,
+                owner TEXT,
+                start_ts REAL,
+                end_ts REAL,
+                expires_ts REAL
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_booking_holds_window
+            ON booking_holds (start_ts, end_ts);
+        """)
+
+    def _active(self, start_ts: float, end_ts: float, now: float) -> List[Tuple[str, datetime, datetime]]:
+        rows = self.conn.execute("""
+            SELECT hold_id, start_ts, end_ts FROM booking_holds
+            WHERE start_ts < ? AND end_ts > ? AND expires_ts > ?
+        """, (end_ts, start_ts, now)).fetchall()
+        return [
+            (hold_id, datetime.fromtimestamp(s, timezone.utc), datetime.fromtimestamp(e, timezone.utc))
+            for hold_id, s, e in rows
+        ]
+
+    def active(self, time_min: datetime, time_max: datetime) -> List[Tuple[str, datetime, datetime]]:
+        """Unexpired holds overlapping [time_min, time_max) as (hold_id, start, end)."""
+        with self.lock:
+            return self._active(time_min.timestamp(), time_max.timestamp(), time.time())
+
+    def acquire(self, start: datetime, end: datetime, owner: str,
+                fits: Callable[[List[Tuple[str, datetime, datetime]]], bool]) -> Optional[str]:
+        """Hold [start, end) if `fits(active_holds)` is still true inside the lock.
+
+        `fits` receives the unexpired holds overlapping the slot and decides
+        whether one more still fits alongside them and the calendar events.
+        Returns the new hold ID, or None if the slot is full.
+        """
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.execute("DELETE FROM booking_holds WHERE expires_ts <= ?", (now,))
+                if not fits(self._active(start.timestamp(), end.timestamp(), now)):
+                    self.conn.execute("COMMIT")
+                    return None
+                hold_id = str(uuid.uuid4())[:8]
+                self.conn.execute(
+                    "INSERT INTO booking_holds (hold_id, owner, start_ts, end_ts, expires_ts) VALUES (?, ?, ?, ?, ?)",
+                    (hold_id, owner, start.timestamp(), end.timestamp(), now + self.ttl_seconds)
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        logger.info(f"Hold {hold_id} placed for {owner}: {start.isoformat()} - {end.isoformat()}")
+        return hold_id
+
+    def acquire_if(self, start: datetime, end: datetime, owner: str, expected: List[str]) -> Optional[str]:
+        """Hold [start, end) only if the overlapping active holds are exactly `expected`.
+
+        For callers that ran their capacity check elsewhere (see Chat/Storage.py).
+        """
+        return self.acquire(start, end, owner, lambda active: sorted(h[0] for h in active) == sorted(expected))
+
+    def release(self, hold_id: Optional[str]) -> None:
+        """Drop a hold once it's booked, declined or no longer needed."""
+        if not hold_id:
+            return
+        with self.lock:
+            self.conn.execute("DELETE FROM booking_holds WHERE hold_id = ?", (hold_id,))
+        logger.info(f"Hold {hold_id} released")
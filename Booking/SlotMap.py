@@ -0,0 +1,222 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from Majao_Bot_Modules.Booking.CalendarScript import business_day, capacity_for, query_occupancy
+from Majao_Bot_Modules.Common import TimeUtils
+from Majao_Bot_Modules.Common.TimeUtils import TZ
+
+# Free-slot map for the next few weeks, precomputed so "that slot is taken"
+# replies and "when are you free?" questions don't wait on Google Calendar.
+# The map is built from one freebusy query, stored as JSON, rebuilt nightly and
+# patched for a single day whenever a booking lands on it. Reservation holds
+# are subtracted when the map is read, so it never offers a room that a
+# pending booking is waiting on.
+#
+#   python -m Majao_Bot_Modules.Booking.SlotMap --weeks 3
+
+logger = logging.getLogger(__name__)
+
+LESSON_LENGTHS = (60, 90, 120)  # Minutes
+SLOT_STEP_MINUTES = 30
+DEFAULT_WEEKS = 2
+MAX_AGE_HOURS = 36  # An older map (the nightly job stopped) is ignored
+
+def compute_days(first_day: datetime, days: int, lengths=LESSON_LENGTHS) -> Dict[str, Dict[str, Dict[str, int]]]:
+    """{length: {date: {"HH:MM": free rooms}}} for `days` days from `first_day`, one freebusy call."""
+    day_start, _ = business_day(first_day)
+    _, last_end = business_day(first_day + timedelta(days=days - 1))
+    index = query_occupancy(day_start, last_end)
+
+    slots = {str(length): {} for length in lengths}
+    step = timedelta(minutes=SLOT_STEP_MINUTES)
+    for offset in range(days):
+        day_start, day_end = business_day(first_day + timedelta(days=offset))
+        date_str = day_start.strftime('%Y-%m-%d')
+        for length in lengths:
+            duration = timedelta(minutes=length)
+            free = {}
+            start = day_start
+            while start + duration <= day_end:
+                rooms = capacity_for(start, start + duration) - index.occupancy(start, start + duration)
+                if rooms > 0:
+                    free[start.strftime('%H:%M')] = rooms
+                start += step
+            slots[str(length)][date_str] = free
+    return slots
+
+class SlotMap:
+    """The stored free-slot map, reloaded when another process rewrites the file."""
+
+    def __init__(self, path: str, weeks: int = DEFAULT_WEEKS, holds=None):
+        self.path = path
+        self.weeks = weeks
+        self.holds = holds
+        self.lock = threading.Lock()
+        self.mtime = None
+        self.data = None
+
+    def _read(self) -> Optional[Dict]:
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return None
+        if mtime != self.mtime:
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.error(f"Slot map {self.path} unreadable: {e}")
+                return self.data
+            with self.lock:
+                self.data, self.mtime = data, mtime
+        return self.data
+
+    def _write(self, data: Dict):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp, self.path)  # Readers see the old or the new map, never half of one
+        self.data, self.mtime = data, os.path.getmtime(self.path)
+
+    def rebuild(self) -> Dict:
+        """Recompute the whole map, starting today."""
+        started = time.perf_counter()
+        today = TimeUtils.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        slots = compute_days(today, self.weeks * 7)
+        data = {"generated": TimeUtils.now().isoformat(), "first_day": today.strftime('%Y-%m-%d'),
+                "weeks": self.weeks, "slots": slots}
+        with self.lock:
+            self._write(data)
+        count = sum(len(times) for days in slots.values() for times in days.values())
+        logger.info(f"Slot map rebuilt: {count} free slots over {self.weeks} weeks in {time.perf_counter() - started:.1f}s")
+        return data
+
+    def refresh_day(self, date_str: str):
+        """Recompute one day after a booking, keeping the rest of the map."""
+        data = self._read()
+        if data is None or date_str not in data["slots"].get(str(LESSON_LENGTHS[0]), {}):
+            return
+        day = TZ.localize(datetime.strptime(date_str, '%Y-%m-%d'))
+        slots = compute_days(day, 1)
+        with self.lock:
+            data = dict(self.data)
+            data["slots"] = {length: {**days, **slots.get(length, {})} for length, days in data["slots"].items()}
+            self._write(data)
+        logger.info(f"Slot map refreshed for {date_str}")
+
+    def refresh_day_async(self, date_str: str):
+        def run():
+            try:
+                self.refresh_day(date_str)
+            except Exception as e:
+                logger.error(f"Slot map refresh for {date_str} failed: {e}")
+
+        threading.Thread(target=run, name="slot-map-refresh", daemon=True).start()
+
+    def is_fresh(self) -> bool:
+        data = self._read()
+        if data is None:
+            return False
+        age = TimeUtils.now() - datetime.fromisoformat(data["generated"])
+        return age < timedelta(hours=MAX_AGE_HOURS)
+
+    def free_slots(self, length: int, after: datetime = None, days: int = None) -> List[Tuple[datetime, datetime]]:
+        """Free (start, end) pairs from the map, soonest first, minus active holds.
+
+        Only starts after `after` (default now), within `days` days of it if given.
+        """
+        if not self.is_fresh():
+            return []
+        data = self.data
+        after = after or TimeUtils.now()
+        until = after + timedelta(days=days) if days else None
+        duration = timedelta(minutes=length)
+        candidates = []
+        for date_str, times in sorted(data["slots"].get(str(length), {}).items()):
+            for time_str, rooms in sorted(times.items()):
+                start = TimeUtils.localize(date_str, time_str)
+                if start > after and (until is None or start < until):
+                    candidates.append((start, start + duration, rooms))
+        if not candidates:
+            return []
+
+        held = TimeUtils.IntervalIndex()
+        if self.holds is not None:
+            for hold_id, start, end in self.holds.active(candidates[0][0], candidates[-1][1]):
+                held.add(TimeUtils.event_time(start, end, hold_id))
+        return [(start, end) for start, end, rooms in candidates
+                if rooms > len(held.overlapping(start.timestamp(), end.timestamp()))]
+
+    def suggest(self, requested: datetime, length: int, per_day: int = 2, max_days: int = 3) -> List[Tuple[datetime, datetime]]:
+        """Free slots closest to `requested` on it and the following days."""
+        def distance(slot):
+            start = slot[0]
+            if start.date() == requested.date():
+                return abs((start - requested).total_seconds())
+            # Other days: closest to the time of day the student asked for
+            return abs((start.hour - requested.hour) * 60 + start.minute - requested.minute)
+
+        by_day = {}
+        day_start = requested.replace(hour=0, minute=0, second=0, microsecond=0)
+        for slot in self.free_slots(length, after=max(TimeUtils.now(), day_start)):
+            if slot[0] != requested:
+                by_day.setdefault(slot[0].date(), []).append(slot)
+        suggestions = []
+        for day in sorted(by_day)[:max_days]:
+            suggestions.extend(sorted(sorted(by_day[day], key=distance)[:per_day]))
+        return suggestions
+
+    def upcoming(self, length: int, per_day: int = 4, max_days: int = 3) -> List[Tuple[datetime, datetime]]:
+        """The first few free slots on each of the next days that have any."""
+        by_day = {}
+        for slot in self.free_slots(length):
+            by_day.setdefault(slot[0].date(), []).append(slot)
+        return [slot for day in sorted(by_day)[:max_days] for slot in by_day[day][:per_day]]
+
+    def start_background(self, hour: int) -> threading.Thread:
+        """Rebuild now if the map is missing or stale, then every day at `hour` (Bogotá time)."""
+        def rebuild():
+            try:
+                self.rebuild()
+            except Exception as e:
+                logger.error(f"Slot map rebuild failed: {e}")
+
+        def loop():
+            if not self.is_fresh():
+                rebuild()
+            while True:
+                now = TimeUtils.now()
+                next_run = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+                if next_run <= now:
+                    next_run += timedelta(days=1)
+                time.sleep((next_run - now).total_seconds())
+                rebuild()
+
+        thread = threading.Thread(target=loop, name="slot-map", daemon=True)
+        thread.start()
+        return thread
+
+def format_slots(slots: List[Tuple[datetime, datetime]]) -> str:
+    """One line per day: 'Mon Mar 03: 09:00, 10:30'."""
+    by_day = {}
+    for start, _ in slots:
+        by_day.setdefault(start.strftime('%a %b %d'), []).append(start.strftime('%H:%M'))
+    return "\n".join(f"• {day}: {', '.join(times)}" for day, times in by_day.items())
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(message)s')
+    parser = argparse.ArgumentParser(description="Precompute the free-slot map for the coming weeks")
+    parser.add_argument('--path', default=os.getenv("SLOT_MAP_PATH", "slot_map.json"))
+    parser.add_argument('--weeks', type=int, default=DEFAULT_WEEKS)
+    args = parser.parse_args()
+    SlotMap(args.path, args.weeks).rebuild()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
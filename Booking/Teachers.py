@@ -0,0 +1,60 @@
+import os
+import json
+import logging
+from collections import namedtuple
+from typing import List, Optional
+from Majao_Bot_Modules.Booking.CalendarScript import free_calendars
+
+# Who can take private classes: name, WhatsApp number, email for invites, the
+# styles they teach ("*" for all) and their personal calendar, if any. Booking
+# requests go to every teacher who teaches the style and whose calendar is
+# free at that time; the first one to accept gets the class.
+#
+# Loaded from Booking/teachers.json, or TEACHERS_PATH:
+#   {"teachers": [{"name": "Chris", "number": "+57...", "email": null,
+#                  "styles": ["*"], "calendar_id": null}]}
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "teachers.json")
+
+class Teacher(namedtuple("Teacher", ["name", "number", "email", "styles", "calendar_id"])):
+
+    @property
+    def whatsapp(self) -> str:
+        return f"whatsapp:{self.number}"
+
+    def teaches(self, style: str) -> bool:
+        return "*" in self.styles or style.lower() in self.styles
+
+def _plain_number(number: str) -> str:
+    return number.replace("whatsapp:", "").strip()
+
+class TeacherRegistry:
+    """The teachers in a registry file, looked up by number or style."""
+
+    def __init__(self, path: str):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        self.teachers = [
+            Teacher(t["name"], _plain_number(t["number"]), t.get("email"),
+                    [s.lower() for s in t.get("styles", ["*"])], t.get("calendar_id"))
+            for t in data["teachers"]
+        ]
+        if not self.teachers:
+            raise ValueError(f"No teachers in {path}")
+        logger.info(f"Loaded {len(self.teachers)} teachers from {path}")
+
+    def by_number(self, number: str) -> Optional[Teacher]:
+        number = _plain_number(number)
+        return next((t for t in self.teachers if t.number == number), None)
+
+    def route(self, style: str, start, end) -> List[Teacher]:
+        """Teachers who teach `style` and have nothing on their calendar in [start, end).
+
+        Teachers without a calendar_id are always considered free.
+        """
+        candidates = [t for t in self.teachers if t.teaches(style)]
+        calendars = [t.calendar_id for t in candidates if t.calendar_id]
+        free = free_calendars(calendars, start, end) if calendars else set()
+        return [t for t in candidates if not t.calendar_id or t.calendar_id in free]
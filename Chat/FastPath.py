@@ -0,0 +1,155 @@
+import re
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+# Instant answers for the common questions that map straight onto one entry of
+# the fact sheet ("how much is a private class", "where are you", "what day is
+# zouk"). Only short messages that match exactly one intent are answered here;
+# anything ambiguous falls through to the LLM.
+
+MAX_WORDS = 15  # Longer messages usually carry context the LLM should see
+
+# "When/where is it?" questions, needed alongside the topic for the events
+# whose fact sheet entry is mostly dates and places
+EVENT_QUESTIONS = ["when", "what day", "what days", "which day", "which days", "what time", "where", "next",
+                   "upcoming", "dates", "tonight", "this week", "is there", "are there", "tell me about",
+                   "cuando", "que dia", "que dias", "que hora", "donde", "proximo", "proxima", "fechas", "hoy",
+                   "esta noche", "esta semana", "hay"]
+
+# Intent -> keyword groups; every group needs at least one match.
+INTENTS = {
+    "pricing": [
+        ["how much", "price", "prices", "pricing", "cost", "costs", "rate", "rates", "package", "packages",
+         "cuanto", "cuesta", "precio", "precios", "valor"],
+        ["private", "privates", "privada", "privadas", "privado", "privados", "particular", "particulares"],
+    ],
+    "location": [
+        ["where are you", "where is the studio", "where is majao", "where s the studio", "where s majao",
+         "address", "location", "located", "directions", "how do i get there",
+         "donde queda", "donde quedan", "donde estan", "donde es", "direccion", "ubicacion", "ubicados"],
+    ],
+    "group_days": [
+        ["group", "groups", "grupal", "grupales"],
+        ["when", "what day", "what days", "which day", "which days", "schedule", "cuando", "que dia", "que dias", "horario"],
+    ],
+    "social": [
+        ["social", "socials"],
+        EVENT_QUESTIONS,
+    ],
+    "intensives": [
+        ["bootcamp", "bootcamps", "boot camp", "boot camps", "intensive", "intensives", "workshop", "workshops", "taller"],
+        EVENT_QUESTIONS,
+    ],
+}
+
+# Intent -> words that mean the message is about something else
+# ("how much is the group class?" is not private-class pricing)
+EXCLUDE = {
+    "pricing": ["group", "groups", "grupal", "grupales", "bootcamp", "bootcamps", "boot camp", "intensive",
+                "intensives", "workshop", "workshops", "taller", "social", "rent", "rental", "renting",
+                "alquiler", "alquilar", "arriendo"],
+    "group_days": ["private", "privates", "privada", "privadas", "privado", "privados", "particular", "particulares",
+                   "book", "booking", "reserve", "reservation", "schedule a", "schedule me", "reservar", "agendar"],
+}
+
+# Messages about changing or undoing something always go to the LLM, even when
+# they mention a fact sheet topic ("is the social cancelled tonight?")
+NEGATIVE_WORDS = ["cancel", "cancels", "cancelled", "canceled", "cancelling", "canceling", "cancellation",
+                  "refund", "refunds", "reschedule", "rescheduling", "postpone", "move my", "cant make it",
+                  "can t make it", "cannot make it", "cancelar", "cancelado", "cancelada", "cancelacion",
+                  "reembolso", "devolucion", "reprogramar", "aplazar", "no puedo ir"]
+
+# Group class styles, longest name first so "bacha zouk" isn't read as "zouk"
+STYLE_NAMES = [
+    ("bacha_zouk", ["bacha zouk", "bachazouk", "bacha-zouk"]),
+    ("bachata", ["bachata"]),
+    ("zouk", ["zouk"]),
+]
+DAY_WORDS = ["when", "what day", "which day", "day", "days", "cuando", "que dia", "dia"]
+
+# "When are you free?" style questions, answered from the precomputed slot map
+AVAILABILITY_WORDS = ["free", "available", "availability", "open", "openings", "slots",
+                      "disponible", "disponibles", "disponibilidad", "libre", "libres", "cupo", "cupos"]
+WHEN_WORDS = ["when", "what time", "what times", "which times", "this week", "next week", "tomorrow",
+              "availability", "openings", "slots", "cuando", "que hora", "que horas", "esta semana",
+              "proxima semana", "manana", "disponibilidad", "cupos"]
+
+def normalize(text: str) -> str:
+    """Lowercase, strip accents and punctuation so keywords match either language."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^\w\s-]", " ", text).split())
+
+def _contains(text: str, phrases: List[str]) -> bool:
+    return any(re.search(rf"\b{re.escape(p)}\b", text) for p in phrases)
+
+def asks_availability(message: str) -> bool:
+    """True for short questions about open class times ("when are you free this week?")."""
+    text = normalize(message)
+    if not text or len(text.split()) > MAX_WORDS or _contains(text, NEGATIVE_WORDS):
+        return False
+    return _contains(text, AVAILABILITY_WORDS) and _contains(text, WHEN_WORDS)
+
+class FastPathIndex:
+    """Keyword index over the fact sheet that answers high-confidence matches."""
+
+    def __init__(self, fact_sheet: Dict):
+        self.fact_sheet = fact_sheet
+
+    def match(self, message: str) -> Optional[Tuple[str, Optional[str]]]:
+        """Return (intent, style) if exactly one intent matches, else None."""
+        text = normalize(message)
+        if not text or len(text.split()) > MAX_WORDS or _contains(text, NEGATIVE_WORDS):
+            return None
+
+        matches = [
+            intent for intent, groups in INTENTS.items()
+            if all(_contains(text, g) for g in groups) and not _contains(text, EXCLUDE.get(intent, []))
+        ]
+
+        style = None
+        for key, names in STYLE_NAMES:
+            if _contains(text, names):
+                style = key
+                break
+        if style and _contains(text, DAY_WORDS):
+            # "what day is zouk" is about that style, not the group schedule in general
+            matches = [m for m in matches if m != "group_days"] + ["style_day"]
+
+        if len(matches) != 1:
+            return None
+        return matches[0], style
+
+    def render(self, intent: str, style: Optional[str], user_name: str) -> Optional[str]:
+        fs = self.fact_sheet
+        greeting = f"Hi {user_name}! " if user_name and user_name != "User" else "Hi! "
+        if intent == "pricing":
+            pricing = fs.get("private_classes", {}).get("pricing")
+            return pricing and f"{greeting}Private classes: {pricing}"
+        if intent == "location":
+            location = fs.get("location")
+            return location and f"{greeting}You'll find us here: {location}"
+        if intent == "group_days":
+            group = fs.get("group_classes", {})
+            if not group.get("days"):
+                return None
+            lines = [f"• {text}" for text in group.get("styles", {}).values()]
+            return f"{greeting}Group classes run {group['days']}:\n" + "\n".join(lines)
+        if intent == "style_day":
+            description = fs.get("group_classes", {}).get("styles", {}).get(style)
+            return description and f"{greeting}{description}"
+        if intent == "social":
+            social = fs.get("majao_social")
+            return social and f"{greeting}{social}"
+        if intent == "intensives":
+            intensives = fs.get("intensives")
+            return intensives and f"{greeting}{intensives}"
+        return None
+
+    def answer(self, message: str, user_name: str = "") -> Tuple[Optional[str], str]:
+        """Return (reply, intent); reply is None and intent "llm" when the LLM should handle it."""
+        matched = self.match(message)
+        reply = self.render(*matched, user_name) if matched else None
+        if reply is None:
+            return None, "llm"
+        return reply, matched[0]
@@ -0,0 +1,133 @@
+import os
+import json
+import math
+import time
+import logging
+import threading
+from collections import Counter, namedtuple
+from typing import Dict, List
+from Majao_Bot_Modules.Chat.FastPath import FastPathIndex, normalize
+
+# The studio fact sheet, loaded from a versioned JSON file and split into
+# small chunks with a BM25 index over them. Each LLM prompt only gets the few
+# chunks relevant to the question instead of the whole sheet. The file is
+# re-read when it changes, so content edits don't need an app restart.
+
+logger = logging.getLogger(__name__)
+
+RELOAD_CHECK_SECONDS = 2
+MAX_CHUNK_CHARS = 600
+ALWAYS_INCLUDE = ("about",)  # Chunks every prompt gets regardless of score
+
+STOPWORDS = {
+    "a", "an", "and", "are", "at", "be", "can", "do", "does", "for", "have", "how", "i", "in", "is", "it",
+    "me", "my", "of", "on", "or", "the", "to", "we", "what", "you", "your",
+    "de", "el", "la", "las", "los", "en", "es", "un", "una", "y", "que", "por", "para", "con",
+}
+
+Chunk = namedtuple("Chunk", ["key", "text"])
+Snapshot = namedtuple("Snapshot", ["version", "fact_sheet", "index", "fast_path"])
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in normalize(text).replace("_", " ").split() if t not in STOPWORDS]
+
+def chunk_fact_sheet(fact_sheet: Dict) -> List[Chunk]:
+    """One chunk per leaf entry (Q&A pairs kept together), long entries split by sentence."""
+    chunks = []
+
+    def add(key, title, text):
+        pieces, current = [], ""
+        for sentence in text.replace(". ", ".\n").split("\n"):
+            if current and len(current) + len(sentence) > MAX_CHUNK_CHARS:
+                pieces.append(current)
+                current = ""
+            current = f"{current} {sentence}".strip()
+        pieces.append(current)
+        for piece in pieces:
+            chunks.append(Chunk(key, f"{title}: {piece}"))
+
+    def walk(node, path):
+        if isinstance(node, dict):
+            for name, value in node.items():
+                if path and path[-1] == "q_and_a":
+                    add(".".join(path), f"Q: {name}", f"A: {value}")
+                else:
+                    walk(value, path + [name])
+        else:
+            add(".".join(path), " › ".join(p.replace("_", " ") for p in path), str(node))
+
+    walk(fact_sheet, [])
+    return chunks
+
+class BM25Index:
+    """Okapi BM25 over a small list of chunks; plain Python, built in milliseconds."""
+
+    def __init__(self, chunks: List[Chunk], k1: float = 1.5, b: float = 0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self.term_counts = [Counter(tokenize(c.text)) for c in chunks]
+        self.lengths = [sum(tc.values()) for tc in self.term_counts]
+        self.avg_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+        df = Counter(term for tc in self.term_counts for term in tc)
+        n = len(chunks)
+        self.idf = {term: math.log(1 + (n - freq + 0.5) / (freq + 0.5)) for term, freq in df.items()}
+
+    def search(self, query: str, k: int = 4) -> List[Chunk]:
+        terms = set(tokenize(query))
+        scored = []
+        for i, tc in enumerate(self.term_counts):
+            score = 0.0
+            for term in terms:
+                freq = tc.get(term)
+                if freq:
+                    norm = freq + self.k1 * (1 - self.b + self.b * self.lengths[i] / self.avg_length)
+                    score += self.idf[term] * freq * (self.k1 + 1) / norm
+            if score > 0:
+                scored.append((score, i))
+        scored.sort(reverse=True)
+        return [self.chunks[i] for _, i in scored[:k]]
+
+class KnowledgeBase:
+    """Fact sheet file plus its index, hot-reloaded when the file changes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.mtime = None
+        self.last_check = 0.0
+        self.snapshot = None
+        self._load()
+
+    def _load(self):
+        mtime = os.path.getmtime(self.path)
+        with open(self.path, encoding="utf-8") as f:
+            data = json.load(f)
+        fact_sheet = data["fact_sheet"]
+        self.snapshot = Snapshot(
+            data.get("version"), fact_sheet, BM25Index(chunk_fact_sheet(fact_sheet)), FastPathIndex(fact_sheet)
+        )
+        self.mtime = mtime
+        logger.info(f"Loaded fact sheet v{self.snapshot.version} from {self.path} ({len(self.snapshot.index.chunks)} chunks)")
+
+    def current(self) -> Snapshot:
+        """The latest snapshot, reloading first if the file changed (checked every few seconds)."""
+        now = time.monotonic()
+        if now - self.last_check >= RELOAD_CHECK_SECONDS:
+            with self.lock:
+                if now - self.last_check >= RELOAD_CHECK_SECONDS:
+                    self.last_check = now
+                    try:
+                        if os.path.getmtime(self.path) != self.mtime:
+                            self._load()
+                    except (OSError, ValueError, KeyError) as e:
+                        # Keep serving the last good version while the file is being edited
+                        logger.error(f"Fact sheet reload failed, keeping v{self.snapshot.version}: {e}")
+        return self.snapshot
+
+    def relevant_chunks(self, query: str, k: int = 4, snapshot: Snapshot = None) -> List[Chunk]:
+        """Top-k BM25 matches for `query`, after the ALWAYS_INCLUDE chunks."""
+        snapshot = snapshot or self.current()
+        found = snapshot.index.search(query, k)
+        pinned = [c for c in snapshot.index.chunks if c.key in ALWAYS_INCLUDE and c not in found]
+        return pinned + found
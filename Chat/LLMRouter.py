@@ -0,0 +1,170 @@
+import time
+import logging
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional
+from langchain_core.language_models import SimpleChatModel
+from Majao_Bot_Modules.Chat import Metrics
+
+# Routes chat completions across several LLM endpoints so one slow or failing
+# provider doesn't stall student replies:
+#  - each provider has a concurrency limit and a circuit breaker
+#  - if the first provider is slower than its usual p95, a hedged request goes
+#    to the next one and whichever answers first wins
+#  - errors fall through to the next provider, and only when all of them fail
+#    does the student get the canned "try again" reply
+
+logger = logging.getLogger(__name__)
+
+class CircuitBreaker:
+    """Stop calling a provider after repeated failures, retry after a cooldown."""
+
+    def __init__(self, failure_threshold: int = 3, reset_seconds: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_seconds:
+                # Half-open: let one request through to probe the provider
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    @property
+    def is_open(self) -> bool:
+        """Open and still cooling down (a provider due for a probe counts as closed)."""
+        opened_at = self.opened_at
+        return opened_at is not None and time.monotonic() - opened_at < self.reset_seconds
+
+class LLMProvider:
+    """One chat model plus the limits and latency history the router keeps for it."""
+
+    def __init__(self, name: str, model: SimpleChatModel, max_concurrency: int = 4,
+                 failure_threshold: int = 3, reset_seconds: float = 30, latency_window: int = 200):
+        self.name = name
+        self.model = model
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.breaker = CircuitBreaker(failure_threshold, reset_seconds)
+        self.latencies = deque(maxlen=latency_window)
+
+    def latency_percentile(self, pct: float) -> Optional[float]:
+        samples = sorted(self.latencies)
+        if len(samples) < 20:
+            return None
+        return samples[min(len(samples) - 1, int(pct * len(samples)))]
+
+    def call(self, messages: List, wait_until: Optional[float] = None, **kwargs) -> str:
+        """Call the model if the breaker and concurrency limit allow it; raises on failure.
+
+        Without `wait_until` a full provider fails at once so the caller can
+        move on to the next one; with it (a time.monotonic() deadline) the call
+        queues for a free slot until then.
+        """
+        if not self.breaker.allow():
+            raise RuntimeError(f"{self.name}: circuit open")
+        if wait_until is None:
+            acquired = self.semaphore.acquire(blocking=False)
+        else:
+            acquired = self.semaphore.acquire(timeout=max(wait_until - time.monotonic(), 0))
+        if not acquired:
+            raise RuntimeError(f"{self.name}: concurrency limit reached")
+        start = time.perf_counter()
+        try:
+            reply = self.model._call(messages, **kwargs)
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        finally:
+            self.semaphore.release()
+        elapsed = time.perf_counter() - start
+        self.latencies.append(elapsed)
+        self.breaker.record_success()
+        Metrics.STAGE_SECONDS.observe(f"llm_{self.name}", elapsed)
+        return reply
+
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm")
+
+class LLMRouter(SimpleChatModel):
+    """SimpleChatModel that spreads calls over `providers`, in priority order."""
+
+    providers: List[Any]
+    hedge_percentile: float = 0.95
+    default_hedge_seconds: float = 4.0  # Used until a provider has enough latency samples
+    min_hedge_seconds: float = 0.5
+    timeout_seconds: float = 45.0
+    fallback_reply: str = "Something’s not working—let’s try that again."
+
+    def _hedge_delay(self, provider: LLMProvider) -> float:
+        p = provider.latency_percentile(self.hedge_percentile)
+        return max(self.min_hedge_seconds, p if p is not None else self.default_hedge_seconds)
+
+    def _submit(self, provider: LLMProvider, messages: List, kwargs: Dict, wait_until: Optional[float] = None):
+        # Carry the webhook's request ID into the worker thread for logging
+        context = contextvars.copy_context()
+        future = _executor.submit(context.run, provider.call, messages, wait_until, **kwargs)
+        future.provider = provider
+        return future
+
+    def _call(self, messages: List, stop: Optional[List[str]] = None, **kwargs) -> str:
+        request_id = Metrics.request_id.get()
+        deadline = time.monotonic() + self.timeout_seconds
+        remaining = [p for p in self.providers if not p.breaker.is_open] or list(self.providers)
+        pending = set()
+
+        with Metrics.span("llm_call"):
+            while pending or remaining:
+                if not pending:
+                    leader = remaining.pop(0)
+                    # The last provider has nothing to fall over to, so it waits for a slot
+                    pending.add(self._submit(leader, messages, kwargs, None if remaining else deadline))
+                time_left = deadline - time.monotonic()
+                if time_left <= 0:
+                    break
+                # Give the latest request until its usual p95 before hedging
+                wait_for = min(self._hedge_delay(leader), time_left) if remaining else time_left
+                done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+                if not done:
+                    if remaining:
+                        logger.info(f"[{request_id}] {leader.name} slower than {wait_for:.1f}s, hedging to {remaining[0].name}")
+                        leader = remaining.pop(0)
+                        pending.add(self._submit(leader, messages, kwargs, None if remaining else deadline))
+                    continue
+                for future in done:
+                    try:
+                        return future.result()
+                    except Exception as e:
+                        logger.warning(f"[{request_id}] LLM provider {future.provider.name} failed: {e}")
+                # Failed fast: move on to the next provider without waiting out the hedge delay
+                if remaining:
+                    leader = remaining.pop(0)
+                    pending.add(self._submit(leader, messages, kwargs, None if remaining else deadline))
+
+        logger.error(f"[{request_id}] All LLM providers failed or timed out")
+        return self.fallback_reply
+
+    @property
+    def _llm_type(self) -> str:
+        return "router"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"providers": [p.name for p in self.providers]}
@@ -0,0 +1,293 @@
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import requests
+from werkzeug.serving import make_server
+from Majao_Bot_Modules.Chat import Metrics, MockServices
+from Majao_Bot_Modules.Chat.StorageServer import StorageServer
+from Majao_Bot_Modules.Common import GoogleClient
+from Majao_Bot_Modules.Common.TimeUtils import TZ
+
+# Offline load test for the /webhook pipeline in StudentChat.
+# DeepSeek (plus a fallback LLM), Twilio and Google Calendar are replaced by local mock servers with
+# configurable latency and error rates, the chat database lives in a temp file,
+# and a mix of student and teacher WhatsApp messages is replayed concurrently.
+#
+#   python -m Majao_Bot_Modules.Chat.LoadTest --requests 500 --concurrency 16
+#
+# Exits non-zero if --max-p95-ms is given and exceeded, so it can gate deploys.
+
+# Teacher replies are generated before any booking exists; this is swapped for
+# one of the teacher's pending booking IDs when the reply is sent
+BOOKING_ID_PLACEHOLDER = "{booking_id}"
+
+FAQ_MESSAGES = [
+    "How much is a private class?",
+    "Where is the studio?",
+    "What day is zouk?",
+    "Do you have bachata classes on Thursday?",
+    "Tell me about the bootcamps",
+    "Can I pay by card?",
+    "What is your teaching philosophy?",
+    "Is there a social this Wednesday?",
+    "When are you free this week?",
+]
+STYLES = ["salsa", "bachata", "zouk", "kizomba", "porro"]
+HOURS = ["8am", "9am", "10am", "11am", "12pm", "1pm", "2pm", "3pm", "4pm", "5pm"]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline load test for the chat webhook")
+    parser.add_argument('--requests', type=int, default=300, help="messages to replay")
+    parser.add_argument('--concurrency', type=int, default=8, help="simultaneous senders")
+    parser.add_argument('--mix', default="faq=0.7,booking=0.2,teacher=0.1",
+                        help="share of FAQ, booking and teacher reply messages")
+    parser.add_argument('--seed', type=int, default=1)
+    for service, latency in (('deepseek', 800), ('fallback', 1200), ('twilio', 150), ('google', 200)):
+        parser.add_argument(f'--{service}-latency-ms', type=float, default=latency)
+        parser.add_argument(f'--{service}-jitter-ms', type=float, default=latency / 4)
+        parser.add_argument(f'--{service}-error-rate', type=float, default=0.0)
+    parser.add_argument('--storage', choices=['sqlite', 'http'], default='sqlite',
+                        help="chat state in a SQLite file, or behind a local StorageServer")
+    parser.add_argument('--json', help="also write the report to this file")
+    parser.add_argument('--max-p95-ms', type=float, help="fail if overall p95 latency exceeds this")
+    return parser.parse_args()
+
+class DbStats:
+    """Time spent in storage calls and how often they hit a locked database."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ops = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.locked_errors = 0
+
+    def record(self, seconds, locked=False):
+        with self.lock:
+            self.ops += 1
+            self.seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+            self.locked_errors += locked
+
+class TimedDb:
+    """Proxy for the chat storage or hold store that reports into DbStats."""
+
+    TIMED = {'log_message', 'history', 'add_booking_request', 'find_booking', 'update_booking',
+             'add_teacher_requests', 'teacher_requests', 'booking_teachers', 'claim_booking',
+             'set_teacher_request', 'add_pending_notification', 'active', 'acquire', 'release'}
+
+    def __init__(self, target, stats):
+        self._target = target
+        self._stats = stats
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if name not in self.TIMED:
+            return attr
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = attr(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                self._stats.record(time.perf_counter() - start, locked='locked' in str(e))
+                raise
+            self._stats.record(time.perf_counter() - start)
+            return result
+
+        return timed
+
+def start_mocks(args):
+    mocks = {}
+    for name, factory in (('deepseek', MockServices.deepseek_service),
+                          ('fallback', lambda **kw: MockServices.deepseek_service(name="fallback", **kw)),
+                          ('twilio', MockServices.twilio_service),
+                          ('google', MockServices.google_calendar_service)):
+        mocks[name] = factory(
+            latency_ms=getattr(args, f'{name}_latency_ms'),
+            jitter_ms=getattr(args, f'{name}_jitter_ms'),
+            error_rate=getattr(args, f'{name}_error_rate'),
+        ).start()
+    return mocks
+
+def load_chat(mocks, db_path, storage_url=None):
+    """Import StudentChat wired to the mocks and a scratch database."""
+    if storage_url:
+        os.environ["MAJAO_STORAGE_URL"] = storage_url
+    os.environ.update({
+        "DEEPSEEK_API_KEY": "load-test",
+        "TWILIO_SID": "ACloadtest",
+        "TWILIO_TOKEN": "load-test",
+        "TEACHER_EMAIL": "teacher@example.com",
+        "MAJAO_DB_PATH": db_path,
+        "DEEPSEEK_API_URL": f"{mocks['deepseek'].url}/v1/chat/completions",
+        "FALLBACK_LLM_URL": f"{mocks['fallback'].url}/v1/chat/completions",
+        "TWILIO_API_URL": mocks['twilio'].url,
+    })
+    google_url = mocks['google'].url
+    GoogleClient.set_transport_factory(lambda: MockServices.RedirectingHttp(google_url))
+    from Majao_Bot_Modules.Chat import StudentChat
+    return StudentChat
+
+def build_traffic(count, mix, teacher_number, rng):
+    """Return [(kind, form data)] for a realistic mix of webhook posts."""
+    weights = dict((k, float(v)) for k, v in (part.split('=') for part in mix.split(',')))
+    kinds = rng.choices(list(weights), weights=list(weights.values()), k=count)
+    tomorrow = (datetime.now(TZ) + timedelta(days=1)).strftime('%Y-%m-%d')
+    requested = []
+    traffic = []
+    for i, kind in enumerate(kinds):
+        student = f"+57300{rng.randrange(10**6):06d}"
+        if kind == 'faq':
+            body, sender = rng.choice(FAQ_MESSAGES), student
+        elif kind == 'booking':
+            hour = rng.choice(HOURS)
+            body, sender = f"Can I book tomorrow {rng.choice(STYLES)} at {hour}", student
+            requested.append(hour)
+        else:
+            sender = teacher_number
+            roll = rng.random()
+            if requested and roll < 0.3:
+                hour = rng.choice(requested)
+                hh = int(hour[:-2]) % 12 + (12 if hour.endswith('pm') else 0)
+                body = f"YES {tomorrow} {hh:02d}:00"
+            elif requested and roll < 0.6:
+                body = f"{'YES' if roll < 0.5 else 'NO'} {BOOKING_ID_PLACEHOLDER}"
+            else:
+                body = f"student{i}@example.com"
+        traffic.append((kind, {"From": f"whatsapp:{sender}", "Body": body, "ProfileName": "loadtest",
+                               "MessageSid": f"SMloadtest{i:06d}"}))
+    return traffic
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def fill_booking_id(form, storage):
+    """Put one of the sender's pending booking IDs into a teacher reply.
+
+    With none pending, a made-up ID exercises the "no longer pending" reply.
+    """
+    if BOOKING_ID_PLACEHOLDER not in form["Body"]:
+        return form
+    pending = storage.teacher_requests(form["From"].replace("whatsapp:", ""), 'pending')
+    return dict(form, Body=form["Body"].replace(BOOKING_ID_PLACEHOLDER, pending[0] if pending else "00000000"))
+
+def run(url, traffic, concurrency, storage):
+    results = []
+    local = threading.local()
+
+    def send(item):
+        kind, form = item
+        form = fill_booking_id(form, storage)
+        session = getattr(local, 'session', None) or requests.Session()
+        local.session = session
+        start = time.perf_counter()
+        try:
+            ok = session.post(url, data=form, timeout=60).status_code == 200
+        except requests.RequestException:
+            ok = False
+        return kind, time.perf_counter() - start, ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(send, traffic))
+    return results, time.perf_counter() - start
+
+def summarize(results, elapsed, db_stats, mocks):
+    by_kind = defaultdict(list)
+    for kind, seconds, _ in results:
+        by_kind[kind].append(seconds * 1000)
+    all_ms = [seconds * 1000 for _, seconds, _ in results]
+
+    def latency(values):
+        return {"count": len(values), "p50_ms": percentile(values, 50),
+                "p95_ms": percentile(values, 95), "p99_ms": percentile(values, 99)}
+
+    return {
+        "requests": len(results),
+        "failed": sum(1 for *_, ok in results if not ok),
+        "elapsed_s": elapsed,
+        "throughput_rps": len(results) / elapsed if elapsed else 0.0,
+        "latency": latency(all_ms),
+        "latency_by_kind": {kind: latency(values) for kind, values in sorted(by_kind.items())},
+        "storage": {"ops": db_stats.ops, "total_ms": db_stats.seconds * 1000,
+                   "max_op_ms": db_stats.max_seconds * 1000, "locked_errors": db_stats.locked_errors},
+        "stages": {stage: {"count": series[-1], "mean_ms": series[-2] / series[-1] * 1000}
+                   for stage, series in sorted(Metrics.STAGE_SECONDS.series.items()) if series[-1]},
+        "fast_path_coverage": (lambda c: 1 - c.get("llm", 0) / sum(c.values()) if c else 0.0)(dict(Metrics.FAST_PATH_TOTAL.series)),
+        "mocks": {name: {"requests": m.requests, "injected_errors": m.errors} for name, m in mocks.items()},
+    }
+
+def print_report(report):
+    lat = report["latency"]
+    print(f"\nRequests: {report['requests']} ({report['failed']} failed) in {report['elapsed_s']:.1f}s "
+          f"-> {report['throughput_rps']:.1f} req/s")
+    print(f"Latency  p50 {lat['p50_ms']:.0f} ms | p95 {lat['p95_ms']:.0f} ms | p99 {lat['p99_ms']:.0f} ms")
+    for kind, stats in report["latency_by_kind"].items():
+        print(f"  {kind:<8} n={stats['count']:<5} p50 {stats['p50_ms']:.0f} ms | "
+              f"p95 {stats['p95_ms']:.0f} ms | p99 {stats['p99_ms']:.0f} ms")
+    for stage, stats in report["stages"].items():
+        print(f"  stage {stage:<20} n={stats['count']:<5} mean {stats['mean_ms']:.1f} ms")
+    print(f"Fast path answered {report['fast_path_coverage']:.0%} of regular messages without the LLM")
+    db = report["storage"]
+    print(f"Storage  {db['ops']} ops, {db['total_ms']:.0f} ms total, slowest {db['max_op_ms']:.1f} ms, "
+          f"{db['locked_errors']} 'database is locked' errors")
+    for name, stats in report["mocks"].items():
+        print(f"Mock {name:<8} {stats['requests']} calls, {stats['injected_errors']} injected errors")
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    random.seed(args.seed)
+    mocks = start_mocks(args)
+    db_dir = tempfile.mkdtemp(prefix="majao-loadtest-")
+    db_path = os.path.join(db_dir, "conversations.db")
+    storage_server = None
+    if args.storage == 'http':
+        storage_server = StorageServer(db_path)
+        threading.Thread(target=storage_server.serve_forever, daemon=True).start()
+    chat = load_chat(mocks, db_path, storage_server and storage_server.url)
+
+    db_stats = DbStats()
+    storage = chat.storage  # Untimed, for filling in booking IDs
+    chat.storage = TimedDb(chat.storage, db_stats)
+    chat.holds = TimedDb(chat.holds, db_stats)
+
+    server = make_server('127.0.0.1', 0, chat.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/webhook"
+
+    traffic = build_traffic(args.requests, args.mix, chat.teachers.teachers[0].number, rng)
+    try:
+        results, elapsed = run(url, traffic, args.concurrency, storage)
+    finally:
+        server.shutdown()
+        for mock in mocks.values():
+            mock.stop()
+        if storage_server:
+            storage_server.shutdown()
+
+    report = summarize(results, elapsed, db_stats, mocks)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.max_p95_ms is not None and report["latency"]["p95_ms"] > args.max_p95_ms:
+        print(f"FAIL: p95 {report['latency']['p95_ms']:.0f} ms exceeds {args.max_p95_ms:.0f} ms")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
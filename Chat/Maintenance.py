@@ -0,0 +1,257 @@
+import os
+import sys
+import gzip
+import json
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from statistics import median
+from typing import Dict, List, Optional
+
+# Retention and compaction for the chat database. Messages older than the
+# retention window are moved into gzipped JSON-lines files, one per month
+# (chats_YYYY-MM.jsonl.gz), so history lookups and LIKE scans only touch recent
+# rows. Booking request rows (is_bot = 2) stay in the database because the
+# teacher flow looks them up. After archiving, freed pages are returned with an
+# incremental VACUUM and the planner statistics are refreshed with ANALYZE.
+#
+#   python -m Majao_Bot_Modules.Chat.Maintenance --db conversations.db --archive-dir chat_archive --days 90
+#
+# StudentChat also runs it once a day from a background thread.
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RETENTION_DAYS = 90
+BATCH_SIZE = 500            # Rows archived per write transaction, keeps the webhook's lock waits short
+VACUUM_PAGES = 2000         # Free pages returned to the OS per incremental_vacuum step
+BENCHMARK_REPEAT = 20
+
+CHAT_COLUMNS = ("user_name", "phone_number", "message", "is_bot", "timestamp", "temp_booking_details")
+
+# The queries StudentChat runs on every message, timed before and after maintenance
+BENCHMARK_QUERIES = {
+    "history": ("SELECT message, is_bot FROM chats WHERE phone_number = ? ORDER BY timestamp DESC LIMIT 10", True),
+    "pending_booking": ("""SELECT timestamp, temp_booking_details FROM chats
+                           WHERE temp_booking_details LIKE '%"status":"pending_teacher_approval"%'
+                           AND is_bot = 2 ORDER BY timestamp DESC LIMIT 1""", False),
+    "awaiting_email": ("""SELECT temp_booking_details FROM chats
+                          WHERE temp_booking_details LIKE '%"status":"awaiting_email"%'
+                          AND is_bot = 2 ORDER BY timestamp DESC LIMIT 1""", False),
+}
+
+def connect(db_path: str) -> sqlite3.Connection:
+    # Autocommit so each batch is its own short BEGIN IMMEDIATE transaction
+    conn = sqlite3.connect(db_path, isolation_level=None, timeout=30)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS maintenance_runs (
+            run_date TEXT PRIMARY KEY,
+            started TEXT,
+            report TEXT
+        )
+    """)
+    return conn
+
+def table_sizes(conn: sqlite3.Connection) -> Dict[str, Dict[str, int]]:
+    """Rows and bytes per table (bytes need SQLite's dbstat table, else None)."""
+    tables = [name for (name,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+    try:
+        used = dict(conn.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name"))
+    except sqlite3.OperationalError:
+        used = {}
+    sizes = {}
+    for table in tables:
+        rows = conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+        sizes[table] = {"rows": rows, "bytes": used.get(table)}
+    return sizes
+
+def file_stats(conn: sqlite3.Connection) -> Dict[str, int]:
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    pages = conn.execute("PRAGMA page_count").fetchone()[0]
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return {"file_bytes": pages * page_size, "free_bytes": free * page_size}
+
+def benchmark(conn: sqlite3.Connection, repeat: int = BENCHMARK_REPEAT) -> Dict[str, float]:
+    """Median milliseconds for each of BENCHMARK_QUERIES, using the busiest phone number."""
+    row = conn.execute("""
+        SELECT phone_number FROM chats GROUP BY phone_number ORDER BY COUNT(*) DESC LIMIT 1
+    """).fetchone()
+    phone_number = row[0] if row else ""
+    results = {}
+    for name, (sql, by_phone) in BENCHMARK_QUERIES.items():
+        params = (phone_number,) if by_phone else ()
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            conn.execute(sql, params).fetchall()
+            samples.append(time.perf_counter() - start)
+        results[name] = median(samples) * 1000
+    return results
+
+def archive_path(archive_dir: str, month: str) -> str:
+    return os.path.join(archive_dir, f"chats_{month}.jsonl.gz")
+
+def archive_chats(conn: sqlite3.Connection, archive_dir: str, cutoff: datetime) -> Dict[str, int]:
+    """Move non-booking chat rows older than `cutoff` into per-month archive files.
+
+    Each batch is appended to the archive (a new gzip member) before its rows
+    are deleted, so a crash in between can only duplicate rows in the archive,
+    never lose them. Returns the number of rows archived per month.
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    rowids = [rowid for (rowid,) in conn.execute(
+        "SELECT rowid FROM chats WHERE timestamp < ? AND is_bot != 2 ORDER BY timestamp",
+        (cutoff.isoformat(),)
+    )]
+    archived = defaultdict(int)
+    for i in range(0, len(rowids), BATCH_SIZE):
+        batch = rowids[i:i + BATCH_SIZE]
+        marks = ",".join("?" * len(batch))
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                f"SELECT rowid, {', '.join(CHAT_COLUMNS)} FROM chats WHERE rowid IN ({marks})", batch
+            ).fetchall()
+            by_month = defaultdict(list)
+            for rowid, *values in rows:
+                record = dict(zip(CHAT_COLUMNS, values))
+                by_month[record["timestamp"][:7]].append(record)
+            for month, records in by_month.items():
+                with gzip.open(archive_path(archive_dir, month), "at", encoding="utf-8") as f:
+                    for record in records:
+                        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+                archived[month] += len(records)
+            conn.execute(f"DELETE FROM chats WHERE rowid IN ({marks})", batch)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    return dict(archived)
+
+def compact(conn: sqlite3.Connection) -> bool:
+    """Give free pages back with incremental VACUUM and refresh statistics.
+
+    Incremental vacuum needs auto_vacuum=INCREMENTAL, which an existing file
+    only picks up through one full VACUUM; that is attempted here and retried
+    on the next run if other connections keep the database busy.
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        try:
+            logger.info("Switching chat database to incremental auto_vacuum (one-off full VACUUM)")
+            conn.execute("VACUUM")
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Full VACUUM skipped, will retry next run: {e}")
+    vacuumed = False
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        while free:
+            # Small steps so the webhook never waits long on the write lock
+            conn.execute(f"PRAGMA incremental_vacuum({VACUUM_PAGES})").fetchall()
+            free, before = conn.execute("PRAGMA freelist_count").fetchone()[0], free
+            if free >= before:
+                break
+        vacuumed = True
+    conn.execute("ANALYZE")
+    return vacuumed
+
+def run_maintenance(db_path: str, archive_dir: str, retention_days: int = DEFAULT_RETENTION_DAYS,
+                    force: bool = False) -> Optional[Dict]:
+    """Archive, compact and report. Returns None if another worker already ran today."""
+    conn = connect(db_path)
+    try:
+        today = datetime.now().strftime('%Y-%m-%d')
+        # Claim today's run so several gunicorn workers don't archive the same rows
+        claimed = conn.execute(
+            "INSERT OR IGNORE INTO maintenance_runs (run_date, started) VALUES (?, ?)",
+            (today, datetime.now().isoformat())
+        ).rowcount
+        if not claimed and not force:
+            logger.info(f"Chat maintenance already ran on {today}")
+            return None
+
+        started = time.perf_counter()
+        report = {
+            "before": {"tables": table_sizes(conn), **file_stats(conn), "query_ms": benchmark(conn)},
+            "retention_days": retention_days,
+        }
+        cutoff = datetime.now() - timedelta(days=retention_days)
+        report["archived"] = archive_chats(conn, archive_dir, cutoff)
+        report["incremental_vacuum"] = compact(conn)
+        report["after"] = {"tables": table_sizes(conn), **file_stats(conn), "query_ms": benchmark(conn)}
+        report["elapsed_s"] = time.perf_counter() - started
+
+        conn.execute(
+            "INSERT OR REPLACE INTO maintenance_runs (run_date, started, report) VALUES (?, ?, ?)",
+            (today, datetime.now().isoformat(), json.dumps(report))
+        )
+        log_report(report)
+        return report
+    finally:
+        conn.close()
+
+def log_report(report: Dict):
+    before, after = report["before"], report["after"]
+    logger.info(f"Chat maintenance: archived {sum(report['archived'].values())} messages "
+                f"older than {report['retention_days']} days in {report['elapsed_s']:.1f}s")
+    for table, stats in after["tables"].items():
+        was = before["tables"].get(table, {}).get("rows", 0)
+        size = f", {stats['bytes'] / 1024:.0f} KiB" if stats["bytes"] is not None else ""
+        logger.info(f"  {table:<22} {was} -> {stats['rows']} rows{size}")
+    logger.info(f"  file {before['file_bytes'] / 1024:.0f} KiB -> {after['file_bytes'] / 1024:.0f} KiB")
+    for name, ms in after["query_ms"].items():
+        logger.info(f"  {name:<22} {before['query_ms'][name]:.2f} ms -> {ms:.2f} ms")
+
+def seconds_until(hour: int, now: Optional[datetime] = None) -> float:
+    now = now or datetime.now()
+    next_run = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+def start_background(db_path: str, archive_dir: str, retention_days: int, hour: int) -> threading.Thread:
+    """Run maintenance every day at `hour` (server local time) in a daemon thread."""
+    def loop():
+        while True:
+            time.sleep(seconds_until(hour))
+            try:
+                run_maintenance(db_path, archive_dir, retention_days)
+            except Exception as e:
+                logger.error(f"Chat maintenance failed: {e}")
+
+    thread = threading.Thread(target=loop, name="chat-maintenance", daemon=True)
+    thread.start()
+    return thread
+
+def read_archive(archive_dir: str, month: str) -> List[Dict]:
+    """All archived messages for one month ('YYYY-MM')."""
+    with gzip.open(archive_path(archive_dir, month), "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Archive old chat messages and compact the chat database")
+    parser.add_argument('--db', required=True, help="path to conversations.db")
+    parser.add_argument('--archive-dir', help="where monthly archives go (default: chat_archive next to the db)")
+    parser.add_argument('--days', type=int, default=DEFAULT_RETENTION_DAYS, help="keep this many days of messages")
+    parser.add_argument('--force', action='store_true', help="run even if maintenance already ran today")
+    parser.add_argument('--json', help="also write the report to this file")
+    return parser.parse_args()
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(message)s')
+    args = parse_args()
+    archive_dir = args.archive_dir or os.path.join(os.path.dirname(os.path.abspath(args.db)), "chat_archive")
+    report = run_maintenance(args.db, archive_dir, args.days, force=args.force)
+    if report and args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+import time
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Latency histograms for the webhook pipeline, exposed in Prometheus text
+# format on /metrics. Kept dependency-free: the handful of metrics here don't
+# need prometheus_client.
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers SQLite writes (~ms) up to slow LLM replies (tens of seconds)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Twilio MessageSid of the webhook call being handled, for log correlation
+request_id = ContextVar("request_id", default="-")
+
+class Histogram:
+    """Prometheus-style histogram with one series per label value."""
+
+    def __init__(self, name, help_text, label, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.series = {}  # label value -> [bucket counts..., sum, count]
+
+    def observe(self, label_value, seconds):
+        with self.lock:
+            series = self.series.get(label_value)
+            if series is None:
+                series = self.series[label_value] = [0] * (len(self.buckets) + 2)
+            index = bisect_left(self.buckets, seconds)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += seconds
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            snapshot = {value: list(series) for value, series in self.series.items()}
+        for value, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{self.label}="{value}",le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{self.label}="{value}",le="+Inf"}} {series[-1]}')
+            lines.append(f'{self.name}_sum{{{self.label}="{value}"}} {series[-2]}')
+            lines.append(f'{self.name}_count{{{self.label}="{value}"}} {series[-1]}')
+        return "\n".join(lines)
+
+class Counter:
+    """Prometheus-style counter with one series per label value."""
+
+    def __init__(self, name, help_text, label):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def inc(self, label_value, amount=1):
+        with self.lock:
+            self.series[label_value] = self.series.get(label_value, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            snapshot = dict(self.series)
+        for value, count in sorted(snapshot.items()):
+            lines.append(f'{self.name}{{{self.label}="{value}"}} {count}')
+        return "\n".join(lines)
+
+STAGE_SECONDS = Histogram(
+    "majao_webhook_stage_seconds",
+    "Time spent in each webhook stage (db_insert, intent_extraction, availability_check, llm_call, twilio_send, db_log, ...).",
+    "stage",
+)
+REQUEST_SECONDS = Histogram(
+    "majao_webhook_request_seconds",
+    "End-to-end webhook handling time by message type.",
+    "handler",
+)
+
+FAST_PATH_TOTAL = Counter(
+    "majao_fast_path_total",
+    "Regular messages by how they were answered: a fact sheet intent, or \"llm\".",
+    "intent",
+)
+
+@contextmanager
+def span(stage):
+    """Time the enclosed block as one webhook stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(stage, elapsed)
+        logger.debug(f"[{request_id.get()}] {stage} took {elapsed * 1000:.1f} ms")
+
+def render():
+    """All metrics in Prometheus text exposition format."""
+    return "\n".join(m.render() for m in (STAGE_SECONDS, REQUEST_SECONDS, FAST_PATH_TOTAL)) + "\n"
@@ -0,0 +1,166 @@
+import json
+import random
+import re
+import threading
+import time
+import uuid
+import logging
+from urllib.parse import parse_qs
+import httplib2
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-ins for DeepSeek, Twilio and Google Calendar used by the load
+# test. Each one answers just enough of the real API for StudentChat and
+# CalendarScript, after a configurable delay and with a configurable error rate.
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_API_ROOT = "https://www.googleapis.com"
+
+class MockService:
+    """A local HTTP server for one external API."""
+
+    def __init__(self, name, routes, latency_ms=0, jitter_ms=0, error_rate=0.0):
+        self.name = name
+        self.routes = routes  # [(method, compiled path regex, handler(body) -> (status, payload))]
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name=f"mock-{name}", daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler_class(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _handle(self, method):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length).decode() if length else ''
+                if method == 'GET':  # GET handlers get the query string instead
+                    body = self.path.partition('?')[2]
+                delay = service.latency_ms + random.uniform(-service.jitter_ms, service.jitter_ms)
+                time.sleep(max(delay, 0) / 1000)
+
+                with service.lock:
+                    service.requests += 1
+                    failed = random.random() < service.error_rate
+                    if failed:
+                        service.errors += 1
+                if failed:
+                    status, payload = 503, {"error": f"mock {service.name} failure"}
+                else:
+                    path = self.path.split('?', 1)[0]
+                    for route_method, pattern, handler in service.routes:
+                        if route_method == method and pattern.fullmatch(path):
+                            status, payload = handler(body)
+                            break
+                    else:
+                        status, payload = 404, {"error": f"no mock route for {method} {path}"}
+
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._handle('GET')
+
+            def do_POST(self):
+                self._handle('POST')
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+def deepseek_service(name="deepseek", **kwargs):
+    """Any OpenAI-compatible chat completions endpoint (DeepSeek or the fallback)."""
+    def completion(body):
+        question = json.loads(body)["messages"][-1]["content"]
+        return 200, {"choices": [{"message": {"role": "assistant", "content": f"Mock answer to: {question[:80]}"}}]}
+
+    return MockService(name, [('POST', re.compile(r'/v1/chat/completions'), completion)], **kwargs)
+
+def twilio_service(**kwargs):
+    def create_message(body):
+        return 201, {"sid": "SM" + uuid.uuid4().hex, "status": "queued"}
+
+    return MockService("twilio", [('POST', re.compile(r'/2010-04-01/Accounts/[^/]+/Messages\.json'), create_message)], **kwargs)
+
+def google_calendar_service(busy_probability=0.3, **kwargs):
+    """Calendar stand-in: random busy hours in freebusy and events.list, accepts every insert."""
+    def freebusy(body):
+        request = json.loads(body)
+        start = datetime.fromisoformat(request['timeMin'])
+        end = datetime.fromisoformat(request['timeMax'])
+        calendars = {}
+        for item in request.get('items', []):
+            busy = []
+            hour = start.replace(minute=0, second=0, microsecond=0)
+            while hour < end:
+                if random.random() < busy_probability:
+                    busy.append({
+                        'start': hour.astimezone(timezone.utc).isoformat().replace('+00:00', 'Z'),
+                        'end': (hour + timedelta(hours=1)).astimezone(timezone.utc).isoformat().replace('+00:00', 'Z'),
+                    })
+                hour += timedelta(hours=1)
+            calendars[item['id']] = {'busy': busy}
+        return 200, {'kind': 'calendar#freeBusy', 'calendars': calendars}
+
+    def list_events(query):
+        params = {k: v[0] for k, v in parse_qs(query).items()}
+        start = datetime.fromisoformat(params['timeMin'])
+        end = datetime.fromisoformat(params['timeMax'])
+        items = []
+        hour = start.replace(minute=0, second=0, microsecond=0)
+        while hour < end:
+            for room in ('upstairs', 'downstairs'):  # Up to two classes at once on a shared calendar
+                if random.random() < busy_probability:
+                    items.append({
+                        'summary': f"Mock class {room}",
+                        'start': {'dateTime': hour.isoformat()},
+                        'end': {'dateTime': (hour + timedelta(hours=1)).isoformat()},
+                    })
+            hour += timedelta(hours=1)
+        return 200, {'kind': 'calendar#events', 'items': items}
+
+    def insert_event(body):
+        return 200, {'id': uuid.uuid4().hex, 'status': 'confirmed'}
+
+    return MockService("google", [
+        ('POST', re.compile(r'/calendar/v3/freeBusy'), freebusy),
+        ('GET', re.compile(r'/calendar/v3/calendars/[^/]+/events'), list_events),
+        ('POST', re.compile(r'/calendar/v3/calendars/[^/]+/events'), insert_event),
+    ], **kwargs)
+
+class RedirectingHttp(httplib2.Http):
+    """httplib2 transport that sends Google API calls to a local mock instead.
+
+    Meant for Common.GoogleClient.set_transport_factory.
+    """
+
+    def __init__(self, base_url):
+        super().__init__()
+        self.base_url = base_url
+
+    def request(self, uri, *args, **kwargs):
+        return super().request(uri.replace(GOOGLE_API_ROOT, self.base_url, 1), *args, **kwargs)
@@ -0,0 +1,323 @@
+import os
+import json
+import logging
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+import requests
+from Majao_Bot_Modules.Booking.Reservations import HoldStore
+
+# Where the chat webhook keeps its state: the message log (chats), booking
+# requests waiting on a teacher, each teacher's answer to them
+# (teacher_requests), undelivered teacher notifications and slot holds. Every
+# backend offers the same methods:
+#
+#   log_message, history, add_booking_request, find_booking, update_booking,
+#   add_teacher_requests, teacher_requests, booking_teachers, claim_booking,
+#   set_teacher_request, add_pending_notification, hold_store
+#
+# SqliteStorage is the single-node default. HttpStorage talks to a
+# StorageServer (Chat/StorageServer.py) that owns the SQLite file, so several
+# gunicorn workers or nodes share one consistent copy of the state.
+#
+# MAJAO_STORAGE_URL picks the backend: sqlite:////abs/path/conversations.db
+# (three slashes for a relative path) or http://host:port. A StorageServer
+# reachable from other machines requires MAJAO_STORAGE_TOKEN, sent by
+# HttpStorage in the TOKEN_HEADER header.
+
+logger = logging.getLogger(__name__)
+
+TOKEN_HEADER = "X-Majao-Storage-Token"
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS chats (
+        user_name TEXT,
+        phone_number TEXT,
+        message TEXT,
+        is_bot INTEGER DEFAULT 0,
+        timestamp TEXT,
+        temp_booking_details TEXT,
+        PRIMARY KEY (phone_number, timestamp)
+    );
+
+    CREATE TABLE IF NOT EXISTS pending_notifications (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        teacher_number TEXT,
+        message TEXT,
+        timestamp TEXT,
+        delivered INTEGER DEFAULT 0
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_booking_requests
+    ON chats (phone_number, is_bot, timestamp)
+    WHERE temp_booking_details IS NOT NULL;
+
+    CREATE TABLE IF NOT EXISTS teacher_requests (
+        booking_id TEXT,
+        teacher_number TEXT,
+        status TEXT,
+        updated TEXT,
+        PRIMARY KEY (booking_id, teacher_number)
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_teacher_requests_teacher
+    ON teacher_requests (teacher_number, status, updated);
+"""
+
+BOOKING_REQUEST = 2  # chats.is_bot value for booking request rows
+HOLD_ACQUIRE_ATTEMPTS = 5
+
+def dump_booking(booking_details: dict) -> str:
+    """Serialize booking details compactly so the LIKE lookups below match"""
+    return json.dumps(booking_details, separators=(',', ':'))
+
+class SqliteStorage:
+    """Chat state in a local SQLite file, with one connection per thread."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.local = threading.local()
+        conn = self._conn()
+        # WAL lets history reads run while another thread or process writes
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = sqlite3.connect(self.db_path, timeout=30)
+            # Safe with WAL: a power cut can lose the last commit, never corrupt the file
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def log_message(self, user_name: str, phone_number: str, message: str, is_bot: int,
+                    timestamp: str = None) -> str:
+        timestamp = timestamp or datetime.now().isoformat()
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO chats (user_name, phone_number, message, is_bot, timestamp) VALUES (?, ?, ?, ?, ?)",
+                (user_name, phone_number, message, is_bot, timestamp)
+            )
+        return timestamp
+
+    def history(self, phone_number: str, limit: int = 10) -> List[Tuple[str, int]]:
+        """Latest `limit` messages with this number as (message, is_bot), newest first."""
+        return [tuple(row) for row in self._conn().execute("""
+            SELECT message, is_bot FROM chats
+            WHERE phone_number = ?
+            ORDER BY timestamp DESC
+            LIMIT ?
+        """, (phone_number, limit)).fetchall()]
+
+    def add_booking_request(self, user_name: str, phone_number: str, message: str, details: Dict) -> str:
+        """Store a booking request; returns its key for update_booking."""
+        timestamp = datetime.now().isoformat()
+        with self._conn() as conn:
+            conn.execute("""
+                INSERT INTO chats
+                (user_name, phone_number, message, is_bot, timestamp, temp_booking_details)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (user_name, phone_number, message, BOOKING_REQUEST, timestamp, dump_booking(details)))
+        return timestamp
+
+    def find_booking(self, status: str, date: str = None, time: str = None,
+                     booking_id: str = None) -> Optional[Tuple[str, Dict]]:
+        """Most recent booking request in `status` (optionally for one slot or ID) as (key, details)."""
+        patterns = [f'%"status":"{status}"%']
+        if date and time:
+            patterns.append(f'%"date":"{date}","time":"{time}%')
+        if booking_id:
+            patterns.append(f'%"booking_id":"{booking_id}"%')
+        row = self._conn().execute(f"""
+            SELECT timestamp, temp_booking_details FROM chats
+            WHERE {" AND ".join("temp_booking_details LIKE ?" for _ in patterns)}
+            AND is_bot = {BOOKING_REQUEST}
+            ORDER BY timestamp DESC LIMIT 1
+        """, patterns).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def update_booking(self, key: str, details: Dict, expected_status: str = None) -> bool:
+        """Replace a booking's details; with `expected_status`, only if it's still in that status.
+
+        Returns False if the booking was missing or had already moved on, so
+        two workers can't both act on the same request.
+        """
+        sql = f"UPDATE chats SET temp_booking_details = ? WHERE timestamp = ? AND is_bot = {BOOKING_REQUEST}"
+        params = [dump_booking(details), key]
+        if expected_status:
+            sql += " AND temp_booking_details LIKE ?"
+            params.append(f'%"status":"{expected_status}"%')
+        with self._conn() as conn:
+            return conn.execute(sql, params).rowcount > 0
+
+    def add_teacher_requests(self, booking_id: str, teacher_numbers: List[str]):
+        """Record that a booking request went out to these teachers."""
+        now = datetime.now().isoformat()
+        with self._conn() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO teacher_requests (booking_id, teacher_number, status, updated) VALUES (?, ?, 'pending', ?)",
+                [(booking_id, number, now) for number in teacher_numbers]
+            )
+
+    def teacher_requests(self, teacher_number: str, status: str) -> List[str]:
+        """Booking IDs this teacher has in `status`, most recent first."""
+        return [booking_id for (booking_id,) in self._conn().execute("""
+            SELECT booking_id FROM teacher_requests
+            WHERE teacher_number = ? AND status = ?
+            ORDER BY updated DESC
+        """, (teacher_number, status))]
+
+    def booking_teachers(self, booking_id: str) -> Dict[str, str]:
+        """{teacher number: status} for everyone a booking request went to."""
+        return dict(self._conn().execute(
+            "SELECT teacher_number, status FROM teacher_requests WHERE booking_id = ?", (booking_id,)
+        ))
+
+    def claim_booking(self, booking_id: str, teacher_number: str) -> bool:
+        """First-accept-wins: True if this teacher got the booking, False if someone else already has."""
+        now = datetime.now().isoformat()
+        with self._conn() as conn:
+            # One statement, so SQLite's write lock makes the check and the claim atomic
+            won = conn.execute("""
+                UPDATE teacher_requests SET status = 'accepted', updated = ?
+                WHERE booking_id = ? AND teacher_number = ? AND status = 'pending'
+                AND NOT EXISTS (
+                    SELECT 1 FROM teacher_requests WHERE booking_id = ? AND status = 'accepted'
+                )
+            """, (now, booking_id, teacher_number, booking_id)).rowcount > 0
+            if won:
+                conn.execute(
+                    "UPDATE teacher_requests SET status = 'taken', updated = ? WHERE booking_id = ? AND status = 'pending'",
+                    (now, booking_id)
+                )
+        return won
+
+    def set_teacher_request(self, booking_id: str, teacher_number: str, status: str):
+        with self._conn() as conn:
+            conn.execute(
+                "UPDATE teacher_requests SET status = ?, updated = ? WHERE booking_id = ? AND teacher_number = ?",
+                (status, datetime.now().isoformat(), booking_id, teacher_number)
+            )
+
+    def add_pending_notification(self, teacher_number: str, message: str):
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO pending_notifications (teacher_number, message, timestamp) VALUES (?, ?, ?)",
+                (teacher_number, message, datetime.now().isoformat())
+            )
+
+    def hold_store(self, ttl_minutes: int) -> HoldStore:
+        return HoldStore(self.db_path, ttl_minutes)
+
+class HttpHoldStore:
+    """HoldStore over a StorageServer.
+
+    `fits` can't run on the server, so acquisition is optimistic: read the
+    active holds, check `fits` locally, and ask the server to insert only if
+    those holds are still exactly the active ones, retrying on a race.
+    """
+
+    def __init__(self, storage: "HttpStorage"):
+        self.storage = storage
+
+    def active(self, time_min: datetime, time_max: datetime) -> List[Tuple[str, datetime, datetime]]:
+        rows = self.storage._call("hold_active", start_ts=time_min.timestamp(), end_ts=time_max.timestamp())
+        return [
+            (hold_id, datetime.fromtimestamp(s, timezone.utc), datetime.fromtimestamp(e, timezone.utc))
+            for hold_id, s, e in rows
+        ]
+
+    def acquire(self, start: datetime, end: datetime, owner: str, fits) -> Optional[str]:
+        for _ in range(HOLD_ACQUIRE_ATTEMPTS):
+            active = self.active(start, end)
+            if not fits(active):
+                return None
+            hold_id = self.storage._call(
+                "hold_acquire_if", start_ts=start.timestamp(), end_ts=end.timestamp(), owner=owner,
+                expected=[hold[0] for hold in active]
+            )
+            if hold_id:
+                return hold_id
+        logger.warning(f"Hold for {owner} lost {HOLD_ACQUIRE_ATTEMPTS} races, treating the slot as full")
+        return None
+
+    def release(self, hold_id: Optional[str]) -> None:
+        if hold_id:
+            self.storage._call("hold_release", hold_id=hold_id)
+
+class HttpStorage:
+    """Chat state on a StorageServer, shared by every worker and node pointing at it."""
+
+    db_path = None  # Maintenance runs on the server, next to the file
+
+    def __init__(self, base_url: str, timeout: float = 10.0, token: Optional[str] = None):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.token = token
+        self.local = threading.local()
+
+    def _call(self, method: str, **kwargs):
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = self.local.session = requests.Session()
+            if self.token:
+                session.headers[TOKEN_HEADER] = self.token
+        response = session.post(f"{self.base_url}/{method}", json=kwargs, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()["result"]
+
+    def log_message(self, user_name, phone_number, message, is_bot, timestamp=None):
+        return self._call("log_message", user_name=user_name, phone_number=phone_number, message=message,
+                          is_bot=is_bot, timestamp=timestamp)
+
+    def history(self, phone_number, limit=10):
+        return [tuple(row) for row in self._call("history", phone_number=phone_number, limit=limit)]
+
+    def add_booking_request(self, user_name, phone_number, message, details):
+        return self._call("add_booking_request", user_name=user_name, phone_number=phone_number,
+                          message=message, details=details)
+
+    def find_booking(self, status, date=None, time=None, booking_id=None):
+        found = self._call("find_booking", status=status, date=date, time=time, booking_id=booking_id)
+        return tuple(found) if found else None
+
+    def update_booking(self, key, details, expected_status=None):
+        return self._call("update_booking", key=key, details=details, expected_status=expected_status)
+
+    def add_teacher_requests(self, booking_id, teacher_numbers):
+        self._call("add_teacher_requests", booking_id=booking_id, teacher_numbers=teacher_numbers)
+
+    def teacher_requests(self, teacher_number, status):
+        return self._call("teacher_requests", teacher_number=teacher_number, status=status)
+
+    def booking_teachers(self, booking_id):
+        return self._call("booking_teachers", booking_id=booking_id)
+
+    def claim_booking(self, booking_id, teacher_number):
+        return self._call("claim_booking", booking_id=booking_id, teacher_number=teacher_number)
+
+    def set_teacher_request(self, booking_id, teacher_number, status):
+        self._call("set_teacher_request", booking_id=booking_id, teacher_number=teacher_number, status=status)
+
+    def add_pending_notification(self, teacher_number, message):
+        self._call("add_pending_notification", teacher_number=teacher_number, message=message)
+
+    def hold_store(self, ttl_minutes: int) -> HttpHoldStore:
+        """Hold TTL is the server's --hold-minutes; `ttl_minutes` only applies to SQLite."""
+        return HttpHoldStore(self)
+
+STORAGE_BACKENDS = {
+    "sqlite": lambda url: SqliteStorage(url.path[1:]),  # sqlite:///relative.db, sqlite:////absolute.db
+    "http": lambda url: HttpStorage(url.geturl(), token=os.getenv("MAJAO_STORAGE_TOKEN")),
+    "https": lambda url: HttpStorage(url.geturl(), token=os.getenv("MAJAO_STORAGE_TOKEN")),
+}
+
+def open_storage(url: str):
+    """Backend for a MAJAO_STORAGE_URL (sqlite:///path or http://host:port)."""
+    parsed = urlparse(url)
+    if parsed.scheme not in STORAGE_BACKENDS:
+        raise ValueError(f"Unsupported storage URL {url!r}; use sqlite:///path or http://host:port")
+    return STORAGE_BACKENDS[parsed.scheme](parsed)
@@ -0,0 +1,139 @@
+import os
+import sys
+import hmac
+import json
+import logging
+import argparse
+import ipaddress
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from Majao_Bot_Modules.Chat import Maintenance
+from Majao_Bot_Modules.Chat.Storage import TOKEN_HEADER, SqliteStorage
+
+# Serves one SqliteStorage over HTTP so several chat workers or nodes share
+# the same state (MAJAO_STORAGE_URL=http://host:port). Each request is a POST
+# to /<method> with the method's arguments as a JSON object; the reply is
+# {"result": ...}. Nightly chat maintenance runs here, next to the file.
+#
+# The API exposes every chat log and can claim bookings, so it only listens
+# beyond loopback with a shared token (MAJAO_STORAGE_TOKEN on the server and on
+# every worker); requests without it get a 401.
+#
+#   MAJAO_STORAGE_TOKEN=... python -m Majao_Bot_Modules.Chat.StorageServer --db conversations.db --host 0.0.0.0
+
+logger = logging.getLogger(__name__)
+
+STORAGE_METHODS = {"log_message", "history", "add_booking_request", "find_booking", "update_booking",
+                   "add_teacher_requests", "teacher_requests", "booking_teachers", "claim_booking",
+                   "set_teacher_request", "add_pending_notification"}
+
+class StorageServer:
+    """ThreadingHTTPServer in front of a SqliteStorage and its hold table."""
+
+    def __init__(self, db_path, host='127.0.0.1', port=0, hold_minutes=180, token=None):
+        if not token and not _is_loopback(host):
+            raise ValueError(f"Refusing to serve chat storage on {host} without a token (set MAJAO_STORAGE_TOKEN)")
+        self.token = token
+        self.storage = SqliteStorage(db_path)
+        self.holds = self.storage.hold_store(hold_minutes)
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def dispatch(self, method, args):
+        if method in STORAGE_METHODS:
+            return getattr(self.storage, method)(**args)
+        if method == "hold_active":
+            return [
+                (hold_id, start.timestamp(), end.timestamp())
+                for hold_id, start, end in self.holds.active(_utc(args["start_ts"]), _utc(args["end_ts"]))
+            ]
+        if method == "hold_acquire_if":
+            return self.holds.acquire_if(_utc(args["start_ts"]), _utc(args["end_ts"]), args["owner"], args["expected"])
+        if method == "hold_release":
+            return self.holds.release(args["hold_id"])
+        raise KeyError(method)
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, workers reuse their connection
+            disable_nagle_algorithm = True  # Headers and body go out as separate writes
+
+            def do_POST(self):
+                method = self.path.strip("/")
+                if server.token and not hmac.compare_digest(self.headers.get(TOKEN_HEADER, "").encode(), server.token.encode()):
+                    self.close_connection = True  # The body is left unread
+                    self._reply(401, {"error": "missing or wrong storage token"})
+                    return
+                try:
+                    length = int(self.headers.get('Content-Length') or 0)
+                    args = json.loads(self.rfile.read(length) or b"{}")
+                    status, payload = 200, {"result": server.dispatch(method, args)}
+                except KeyError as e:
+                    status, payload = 404, {"error": f"unknown method or argument {e}"}
+                except Exception as e:
+                    logger.error(f"Storage call {method} failed: {e}")
+                    status, payload = 500, {"error": str(e)}
+                self._reply(status, payload)
+
+            def _reply(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def serve_forever(self):
+        logger.info(f"Chat storage for {self.storage.db_path} listening on {self.url}")
+        self.server.serve_forever()
+
+    def shutdown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def _is_loopback(host):
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+def _utc(ts):
+    return datetime.fromtimestamp(ts, timezone.utc)
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(message)s')
+    parser = argparse.ArgumentParser(description="Shared chat state for several chat workers")
+    parser.add_argument('--db', default=os.getenv("MAJAO_DB_PATH", "conversations.db"))
+    parser.add_argument('--host', default='127.0.0.1', help="anything but loopback needs MAJAO_STORAGE_TOKEN")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--hold-minutes', type=int, default=int(os.getenv("BOOKING_HOLD_MINUTES", "180")))
+    parser.add_argument('--maintenance-hour', type=int, default=4, help="daily archive/compaction hour, -1 to disable")
+    parser.add_argument('--retention-days', type=int, default=Maintenance.DEFAULT_RETENTION_DAYS)
+    args = parser.parse_args()
+
+    server = StorageServer(args.db, args.host, args.port, args.hold_minutes, os.getenv("MAJAO_STORAGE_TOKEN"))
+    if args.maintenance_hour >= 0:
+        archive_dir = os.path.join(os.path.dirname(os.path.abspath(args.db)), "chat_archive")
+        Maintenance.start_background(args.db, archive_dir, args.retention_days, args.maintenance_hour)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+import requests
+from werkzeug.serving import make_server
+from Majao_Bot_Modules.Booking.Teachers import DEFAULT_PATH as DEFAULT_TEACHERS_PATH, TeacherRegistry
+from Majao_Bot_Modules.Chat import LoadTest, MockServices
+from Majao_Bot_Modules.Chat.Storage import open_storage
+from Majao_Bot_Modules.Chat.StorageServer import StorageServer
+
+# Multi-process stress test for horizontal scaling. For each worker count,
+# that many separate StudentChat processes (one request at a time each, like
+# gunicorn sync workers) share one chat state, either a StorageServer process
+# or a single SQLite file. The same webhook traffic as LoadTest is spread over
+# them, with DeepSeek, Twilio and Google mocked, and throughput is compared.
+#
+#   python -m Majao_Bot_Modules.Chat.StressTest --workers 1,2,4,8 --requests 400
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Multi-process scaling test for the chat webhook")
+    parser.add_argument('--workers', default="1,2,4", help="comma-separated worker process counts")
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--storage', choices=['http', 'sqlite'], default='http',
+                        help="StorageServer process or one shared SQLite file")
+    parser.add_argument('--mix', default="faq=0.6,booking=0.3,teacher=0.1")
+    parser.add_argument('--llm-latency-ms', type=float, default=300)
+    parser.add_argument('--twilio-latency-ms', type=float, default=60)
+    parser.add_argument('--google-latency-ms', type=float, default=80)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help="also write the results to this file")
+    return parser.parse_args()
+
+def run_worker(mock_urls, db_path, storage_url, ready):
+    """Worker process: one StudentChat app serving one request at a time."""
+    os.environ.update({"CHAT_MAINTENANCE_HOUR": "", "SLOT_MAP_HOUR": ""})
+    mocks = {name: SimpleNamespace(url=url) for name, url in mock_urls.items()}
+    chat = LoadTest.load_chat(mocks, db_path, storage_url)
+    server = make_server('127.0.0.1', 0, chat.app, threaded=False)
+    ready.put(server.server_port)
+    server.serve_forever()
+
+def run_storage_server(db_path, ready):
+    server = StorageServer(db_path)
+    ready.put(server.url)
+    server.serve_forever()
+
+def run_round(args, workers, mocks, traffic):
+    ctx = multiprocessing.get_context("spawn")
+    ready = ctx.Queue()
+    db_path = os.path.join(tempfile.mkdtemp(prefix="majao-stress-"), "conversations.db")
+    processes = []
+    storage_url = None
+    try:
+        if args.storage == 'http':
+            processes.append(ctx.Process(target=run_storage_server, args=(db_path, ready), daemon=True))
+            processes[-1].start()
+            storage_url = ready.get(timeout=60)
+        mock_urls = {name: mock.url for name, mock in mocks.items()}
+        for _ in range(workers):
+            processes.append(ctx.Process(target=run_worker, args=(mock_urls, db_path, storage_url, ready), daemon=True))
+            processes[-1].start()
+        urls = [f"http://127.0.0.1:{ready.get(timeout=120)}/webhook" for _ in range(workers)]
+        storage = open_storage(storage_url or f"sqlite:///{db_path}")  # For filling in booking IDs
+
+        local = threading.local()
+
+        def send(item):
+            i, (kind, form) = item
+            form = LoadTest.fill_booking_id(form, storage)
+            session = getattr(local, 'session', None) or requests.Session()
+            local.session = session
+            start = time.perf_counter()
+            try:
+                ok = session.post(urls[i % workers], data=form, timeout=120).status_code == 200
+            except requests.RequestException:
+                ok = False
+            return kind, time.perf_counter() - start, ok
+
+        start = time.perf_counter()
+        # Two senders per worker keeps every worker busy without a deep queue
+        with ThreadPoolExecutor(max_workers=2 * workers) as pool:
+            results = list(pool.map(send, enumerate(traffic)))
+        elapsed = time.perf_counter() - start
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT COUNT(*) FROM chats").fetchone()[0]
+    conn.close()
+    latencies = [seconds * 1000 for _, seconds, _ in results]
+    return {
+        "workers": workers,
+        "requests": len(results),
+        "failed": sum(1 for *_, ok in results if not ok),
+        "elapsed_s": elapsed,
+        "throughput_rps": len(results) / elapsed,
+        "p50_ms": LoadTest.percentile(latencies, 50),
+        "p95_ms": LoadTest.percentile(latencies, 95),
+        "chat_rows": rows,
+    }
+
+def main():
+    args = parse_args()
+    random.seed(args.seed)
+    mocks = {}
+    for name, factory, latency in (('deepseek', MockServices.deepseek_service, args.llm_latency_ms),
+                                   ('fallback', lambda **kw: MockServices.deepseek_service(name="fallback", **kw),
+                                    args.llm_latency_ms),
+                                   ('twilio', MockServices.twilio_service, args.twilio_latency_ms),
+                                   ('google', MockServices.google_calendar_service, args.google_latency_ms)):
+        mocks[name] = factory(latency_ms=latency, jitter_ms=latency / 4).start()
+
+    teacher_number = TeacherRegistry(os.getenv("TEACHERS_PATH", DEFAULT_TEACHERS_PATH)).teachers[0].number
+    rounds = []
+    try:
+        for workers in (int(w) for w in args.workers.split(',')):
+            traffic = LoadTest.build_traffic(args.requests, args.mix, teacher_number, random.Random(args.seed))
+            rounds.append(run_round(args, workers, mocks, traffic))
+            r = rounds[-1]
+            print(f"{workers:>3} workers: {r['throughput_rps']:6.1f} req/s "
+                  f"({r['throughput_rps'] / rounds[0]['throughput_rps']:.1f}x) | "
+                  f"p50 {r['p50_ms']:.0f} ms | p95 {r['p95_ms']:.0f} ms | "
+                  f"{r['failed']} failed | {r['chat_rows']} chat rows")
+    finally:
+        for mock in mocks.values():
+            mock.stop()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"storage": args.storage, "rounds": rounds}, f, indent=2)
+    return 1 if any(r["failed"] for r in rounds) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
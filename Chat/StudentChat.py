@@ -1,9 +1,8 @@
 import os
 import json
 import time
-import sqlite3
 import logging
-from datetime import datetime, timedelta
+from datetime import timedelta
 import requests
 from typing import List, Optional, Dict, Any
 from dotenv import load_dotenv
@@ -12,12 +11,23 @@ from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
-import pytz
 import re
-from flask import Flask, request
+import uuid
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, request
 from twilio.rest import Client
 from twilio.twiml.messaging_response import MessagingResponse
 from Majao_Bot_Modules.Booking.CalendarScript import check_availability, schedule_event
+from Majao_Bot_Modules.Booking.SlotMap import SlotMap, format_slots
+from Majao_Bot_Modules.Booking.Teachers import DEFAULT_PATH as DEFAULT_TEACHERS_PATH, Teacher, TeacherRegistry
+from Majao_Bot_Modules.Common import TimeUtils
+from Majao_Bot_Modules.Chat import Maintenance, Metrics
+from Majao_Bot_Modules.Chat.LLMRouter import LLMProvider, LLMRouter
+from Majao_Bot_Modules.Chat.FastPath import asks_availability
+from Majao_Bot_Modules.Chat.KnowledgeBase import KnowledgeBase
+from Majao_Bot_Modules.Chat.Storage import open_storage
+from Majao_Bot_Modules.Chat.Metrics import span
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -31,98 +41,81 @@ TWILIO_AUTH_TOKEN = os.getenv("TWILIO_TOKEN")
 if not all([DEEPSEEK_API_KEY, TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN]):
     raise ValueError("Missing required environment variables")
 
-# SQLite setup
-db_path = "/Users/chrispasco/Documents/MachineLearning/Majao_Chatbot/conversations.db"
-conn = sqlite3.connect(db_path, check_same_thread=False)
-cursor = conn.cursor()
-
-# Create tables if they don't exist
-cursor.executescript("""
-    CREATE TABLE IF NOT EXISTS chats (
-        user_name TEXT, 
-        phone_number TEXT, 
-        message TEXT, 
-        is_bot INTEGER DEFAULT 0, 
-        timestamp TEXT,
-        temp_booking_details TEXT,
-        PRIMARY KEY (phone_number, timestamp)
-    );
-    
-    CREATE TABLE IF NOT EXISTS pending_notifications (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        teacher_number TEXT,
-        message TEXT,
-        timestamp TEXT,
-        delivered INTEGER DEFAULT 0
-    );
-    
-    CREATE INDEX IF NOT EXISTS idx_booking_requests 
-    ON chats (phone_number, is_bot, timestamp) 
-    WHERE temp_booking_details IS NOT NULL;
-""")
-conn.commit()
+# Chat state: a local SQLite file by default, or a shared StorageServer when
+# several workers or nodes run the webhook (see Chat/Storage.py)
+db_path = os.getenv("MAJAO_DB_PATH", "/Users/chrispasco/Documents/MachineLearning/Majao_Chatbot/conversations.db")
+storage = open_storage(os.getenv("MAJAO_STORAGE_URL") or f"sqlite:///{db_path}")
+# Local files (chat archive, slot map) live next to the SQLite file in use, or
+# in the working directory when the state is on a StorageServer
+data_dir = os.path.dirname(os.path.abspath(storage.db_path)) if storage.db_path else os.getcwd()
+
+# Slot holds for bookings waiting on the teacher, so two students can't both be
+# sent to the teacher for the last free room
+holds = storage.hold_store(int(os.getenv("BOOKING_HOLD_MINUTES", "180")))
+
+# Nightly archival of old messages and compaction, see Chat/Maintenance.py.
+# Set CHAT_MAINTENANCE_HOUR to an empty string to run it from cron instead.
+# With a StorageServer it runs on the server.
+CHAT_RETENTION_DAYS = int(os.getenv("CHAT_RETENTION_DAYS", str(Maintenance.DEFAULT_RETENTION_DAYS)))
+CHAT_ARCHIVE_DIR = os.getenv("CHAT_ARCHIVE_DIR", os.path.join(data_dir, "chat_archive"))
+if os.getenv("CHAT_MAINTENANCE_HOUR", "4") and storage.db_path:
+    Maintenance.start_background(storage.db_path, CHAT_ARCHIVE_DIR, CHAT_RETENTION_DAYS, int(os.getenv("CHAT_MAINTENANCE_HOUR", "4")))
 
 # Twilio setup
 twilio_client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+if os.getenv("TWILIO_API_URL"):  # Local stand-in, see Chat/LoadTest.py
+    twilio_client.api.base_url = os.getenv("TWILIO_API_URL")
 TWILIO_WHATSAPP_NUMBER = "whatsapp:+16012862526"
 TWILIO_SMS_NUMBER = "+16012862526"  # Your Twilio phone number
-TEACHER_NUMBER = "whatsapp:+573052622525"  # Chris's number
-
-
-# Updated fact sheet
-fact_sheet = {
-    "about": "Majao Studio’s in the heart of Laureles, Medellín, near Carrera 70. We’re a space for creativity, freedom, and connection through dance—a place where every step tells a story and adapts to the moment. It’s not about perfection; it’s about expression.",
-    "group_classes": {
-        "days": "Tuesdays, Wednesdays, Thursdays",
-        "styles": {
-            "bacha_zouk": "Tuesdays: A fusion of Bachata’s rhythm and Zouk’s flow—fluid, creative, and open-ended. No rigid figures, just movement that breathes.",
-            "bachata": "Thursdays: Focused on connection, adaptability, and smooth flow. Learn to dance with your partner, not just at them.",
-            "zouk": "Wednesdays: Deep connection, fluid motion, and total freedom. It’s about feeling the music and letting go."
-        }
-    },
-    "private_classes": {
-        "availability": "Available all week with Medellín’s best instructors.",
-        "styles": "Bachata, Zouk, Salsa, Porro, Kazumba—customized to your goals, whether it’s technique, confidence, or just fun.",
-        "pricing": "90,000 COP per hour. Packages available: 4 sessions for 340,000 COP, 8 sessions for 650,000 COP, 10 sessions for 750,000 COP. Custom packages can be arranged (e.g., 6 sessions at 85,000 COP/hour, total 510,000 COP). Payment by cash or Bancolombia transfers only."
-    },
-    "intensives": "Boot camps every few weeks (2-3 hours, Saturdays)—options like contemporary Bachata/Zouk fusion, traditional Bachata roots, or men’s styling. Also, a four-week workshop Thursdays 7:00-8:30 PM on playful, spontaneous dance.",
-    "majao_social": "Wednesdays: 7:30 PM Bachata class, followed by an 8:30 PM social—Bachata, Salsa, Zouk. Occasional shows or friendly competitions. Two rooms: upstairs (Bachata + Salsa), downstairs (Zouk).",
-    "location": "Majao Studio, Laureles, Medellín: https://maps.app.goo.gl/Gf3iMTcZNYMeXPhF7",
-    "q_and_a": {
-        "What is MAJAO’s teaching philosophy?": "At MAJAO, we believe dance should feel natural, like a conversation rather than a script. Instead of focusing on memorization, we emphasize small, adaptable movements—building from the fundamentals to create freedom and play within the dance. Our approach encourages creativity and expression, allowing each dancer to develop their own unique style.",
-        "How does MAJAO approach social dancing?": "Social dancing is about connection and enjoyment, not performance. It’s a shared experience where both partners contribute to the dance. We encourage dancers to be present, listen to their partner, and move with intention—always adaptable and engaged in a dynamic exchange. Every dance is a conversation, and our goal is to help dancers develop the skills to express themselves naturally.",
-        "What makes MAJAO Studio special?": "MAJAO is about freedom in dance. We move away from choreographed sequences and focus on helping dancers find their own unique voice. Our goal is to create a space where dance is a form of artistic expression—fluid, personal, and limitless.",
-        "What is your favorite dance style?": "Bachata is where I feel most at home, especially right now. Kizomba and Zouk are a close second for their fluidity and depth, offering a different kind of connection and expression."
-    }
-}
+LESSON_MINUTES = 60  # Length of a private class booked over chat
+TEACHER_EMAIL = os.getenv("TEACHER_EMAIL")  # Invite address for teachers without one in the registry
+
+# Teachers who take private classes (Booking/teachers.json). Each booking
+# request goes out to every teacher who teaches the style and is free at that
+# time, all at once; the first one to accept gets the class.
+teachers = TeacherRegistry(os.getenv("TEACHERS_PATH", DEFAULT_TEACHERS_PATH))
+notify_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="notify")
+
+# Free slots for the coming weeks, rebuilt nightly at SLOT_MAP_HOUR and after
+# each booking, so alternatives and "when are you free?" answers are instant.
+# Set SLOT_MAP_HOUR to an empty string to rebuild it from cron instead.
+slot_map = SlotMap(
+    os.getenv("SLOT_MAP_PATH", os.path.join(data_dir, "slot_map.json")),
+    int(os.getenv("SLOT_MAP_WEEKS", "2")),
+    holds
+)
+if os.getenv("SLOT_MAP_HOUR", "3"):
+    slot_map.start_background(int(os.getenv("SLOT_MAP_HOUR", "3")))
+
 
+# Fact sheet lives in a versioned JSON file; edits are picked up without a restart
+FACT_SHEET_PATH = os.getenv("FACT_SHEET_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "fact_sheet.json"))
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "4"))  # Fact sheet chunks per LLM prompt
+knowledge = KnowledgeBase(FACT_SHEET_PATH)
 
-# DeepSeek LLM (unchanged from your original)
-# DeepSeek LLM
+
+# DeepSeek LLM (works with any OpenAI-compatible chat completions endpoint)
 class DeepSeekLLM(SimpleChatModel):
     model_name: str = "deepseek-chat"
     temperature: float = 0.5
     api_key: Optional[str] = None
-    api_url: str = "https://api.deepseek.com/v1/chat/completions"
+    api_url: str = os.getenv("DEEPSEEK_API_URL", "https://api.deepseek.com/v1/chat/completions")
+    timeout: float = 30.0
 
-    def __init__(self, model_name="deepseek-chat", temperature=0.5, api_key=None):
+    def __init__(self, model_name="deepseek-chat", temperature=0.5, api_key=None, api_url=None):
         super().__init__(model_name=model_name, temperature=temperature, api_key=api_key)
         self.api_key = api_key or DEEPSEEK_API_KEY
+        if api_url:
+            self.api_url = api_url
 
     def _call(self, messages: List, stop: Optional[List[str]] = None, **kwargs) -> str:
+        """Raises on any error; LLMRouter decides what to try next."""
         headers = {"Content-Type": "application/json", "Authorization": f"Bearer {self.api_key}"}
         deepseek_messages = [{"role": "user" if isinstance(m, HumanMessage) else "assistant" if isinstance(m, AIMessage) else "system", "content": m.content} for m in messages]
         data = {"model": self.model_name, "messages": deepseek_messages, "temperature": self.temperature, **kwargs}
-        try:
-            start_time = time.time()
-            response = requests.post(self.api_url, headers=headers, data=json.dumps(data))
-            response.raise_for_status()
-            elapsed = time.time() - start_time
-            print(f"DeepSeek response time: {elapsed:.2f} seconds")
-            return response.json()["choices"][0]["message"]["content"]
-        except Exception as e:
-            print(f"DeepSeek error: {e}")
-            return "Something’s not working—let’s try that again."
+        response = requests.post(self.api_url, headers=headers, data=json.dumps(data), timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"]
 
     @property
     def _llm_type(self) -> str:
@@ -132,20 +125,30 @@ class DeepSeekLLM(SimpleChatModel):
     def _identifying_params(self) -> Dict[str, Any]:
         return {"model_name": self.model_name, "temperature": self.temperature}
 
-llm = DeepSeekLLM()
+def build_llm() -> LLMRouter:
+    """DeepSeek first, then an optional OpenAI-compatible fallback for hedging and failover"""
+    providers = [LLMProvider("deepseek", DeepSeekLLM(), max_concurrency=int(os.getenv("DEEPSEEK_MAX_CONCURRENCY", "8")))]
+    if os.getenv("FALLBACK_LLM_URL"):
+        fallback = DeepSeekLLM(
+            model_name=os.getenv("FALLBACK_LLM_MODEL", "deepseek-chat"),
+            api_key=os.getenv("FALLBACK_LLM_API_KEY"),
+            api_url=os.getenv("FALLBACK_LLM_URL")
+        )
+        providers.append(LLMProvider("fallback", fallback, max_concurrency=int(os.getenv("FALLBACK_LLM_MAX_CONCURRENCY", "8"))))
+    return LLMRouter(providers=providers)
+
+llm = build_llm()
 
 # Helper functions
 def parse_time(time_str):
     """Standardize time parsing"""
     time_str = time_str.replace(" ", "").lower()
-    if "pm" in time_str and not time_str.startswith("12"):
-        hour = int(time_str.replace("pm", "").split(":")[0]) + 12
-        time_str = f"{hour:02d}:00"
-    elif "am" in time_str:
-        time_str = time_str.replace("am", "")
-    if ":" not in time_str:
-        time_str += ":00"
-    return time_str
+    suffix = time_str[-2:] if time_str.endswith(("am", "pm")) else ""
+    hour, _, minute = time_str.rstrip("apm").partition(":")
+    hour = int(hour)
+    if suffix:
+        hour = hour % 12 + (12 if suffix == "pm" else 0)
+    return f"{hour:02d}:{minute or '00'}"
 
 def extract_booking_details(message: str) -> Optional[Dict[str, str]]:
     """Extract booking details from user message"""
@@ -158,7 +161,7 @@ def extract_booking_details(message: str) -> Optional[Dict[str, str]]:
         return None
         
     date_str, style, time_str = booking_request.groups()
-    tz = pytz.timezone('America/Bogota')
+    today = TimeUtils.now()
     weekdays = {
         "monday": 0, "tuesday": 1, "wednesday": 2, "thursday": 3,
         "friday": 4, "saturday": 5, "sunday": 6
@@ -166,15 +169,14 @@ def extract_booking_details(message: str) -> Optional[Dict[str, str]]:
     
     # Date parsing logic
     if date_str == "tomorrow":
-        date = datetime.now(tz) + timedelta(days=1)
+        date = today + timedelta(days=1)
         date_str = date.strftime('%Y-%m-%d')
     elif date_str.startswith("next "):
         day = date_str.split("next ")[1]
-        days_ahead = (weekdays[day] - datetime.now(tz).weekday() + 7) % 7 or 7
-        date = datetime.now(tz) + timedelta(days=days_ahead)
+        days_ahead = (weekdays[day] - today.weekday() + 7) % 7 or 7
+        date = today + timedelta(days=days_ahead)
         date_str = date.strftime('%Y-%m-%d')
     elif date_str in weekdays:
-        today = datetime.now(tz)
         days_ahead = (weekdays[date_str] - today.weekday() + 7) % 7 or 7
         date = today + timedelta(days=days_ahead)
         date_str = date.strftime('%Y-%m-%d')
@@ -189,39 +191,77 @@ def extract_booking_details(message: str) -> Optional[Dict[str, str]]:
         'status': 'pending_teacher_approval'
     }
 
-def notify_teacher(booking_details: dict) -> bool:
-    """Send booking notification to teacher with fallback to SMS"""
+def notify_teacher(teacher: Teacher, booking_details: dict) -> bool:
+    """Send booking notification to one teacher with fallback to SMS"""
+    booking_id = booking_details['booking_id']
     teacher_msg = (
-        f"📅 New Booking Request:\n"
+        f"📅 New Booking Request ({booking_id}):\n"
         f"Student: {booking_details['user_name']}\n"
         f"Style: {booking_details['style']}\n"
         f"Date: {booking_details['date']}\n"
         f"Time: {booking_details['time']}\n\n"
         f"Reply with:\n"
-        f"YES {booking_details['date']} {booking_details['time']} to confirm\n"
-        f"NO to decline"
+        f"YES {booking_id} to confirm\n"
+        f"NO {booking_id} to decline"
     )
     
     attempts = [
-        {'channel': 'whatsapp', 'to': TEACHER_NUMBER, 'from': TWILIO_WHATSAPP_NUMBER},
-        {'channel': 'sms', 'to': TEACHER_NUMBER.replace("whatsapp:", ""), 'from': TWILIO_SMS_NUMBER}
+        {'channel': 'whatsapp', 'to': teacher.whatsapp, 'from': TWILIO_WHATSAPP_NUMBER},
+        {'channel': 'sms', 'to': teacher.number, 'from': TWILIO_SMS_NUMBER}
     ]
     
     for attempt in attempts:
         try:
-            message = twilio_client.messages.create(
-                body=teacher_msg,
-                from_=attempt['from'],
-                to=attempt['to']
-            )
-            logger.info(f"Sent via {attempt['channel']}, SID: {message.sid}")
+            with span("twilio_send"):
+                message = twilio_client.messages.create(
+                    body=teacher_msg,
+                    from_=attempt['from'],
+                    to=attempt['to']
+                )
+            logger.info(f"Sent to {teacher.name} via {attempt['channel']}, SID: {message.sid}")
             return True
         except Exception as e:
-            logger.error(f"Failed {attempt['channel']} attempt: {str(e)}")
+            logger.error(f"Failed {attempt['channel']} attempt to {teacher.name}: {str(e)}")
     
-    logger.error("All delivery attempts failed")
+    logger.error(f"All delivery attempts to {teacher.name} failed")
     return False
 
+def notify_teachers(eligible: List[Teacher], booking_details: dict) -> List[Teacher]:
+    """Notify every eligible teacher in parallel; returns the ones that got the message"""
+    futures = [
+        # Copy the context so the request ID follows into the worker threads
+        (teacher, notify_pool.submit(contextvars.copy_context().run, notify_teacher, teacher, booking_details))
+        for teacher in eligible
+    ]
+    delivered = []
+    for teacher, future in futures:
+        if future.result():
+            delivered.append(teacher)
+        else:
+            # Store failed notification
+            storage.add_pending_notification(teacher.whatsapp, json.dumps(booking_details))
+    return delivered
+
+def find_teacher_booking(teacher: Teacher, text: str) -> Optional[str]:
+    """Booking ID a teacher's YES/NO refers to, among the requests still pending for them.
+
+    Matches an explicit booking ID, then a "DATE TIME" pair. A reply that
+    names a booking no longer pending for this teacher (e.g. already taken)
+    gets None, never another booking. Only a reply that names nothing falls
+    back to the teacher's most recent pending request.
+    """
+    pending = storage.teacher_requests(teacher.number, 'pending')
+    named = re.findall(r'\b[0-9a-f]{8}\b', text)
+    if named:
+        return next((booking_id for booking_id in named if booking_id in pending), None)
+    slot = re.search(r'(\d{4}-\d{2}-\d{2}) (\d{2}:\d{2})', text)
+    if slot:
+        for booking_id in pending:
+            if storage.find_booking('pending_teacher_approval', *slot.groups(), booking_id=booking_id):
+                return booking_id
+        return None
+    return pending[0] if pending else None
+
 
 # Flask app
 app = Flask(__name__)
@@ -231,77 +271,101 @@ def webhook():
     sender_number = request.values.get("From", "").replace("whatsapp:", "")
     incoming_msg = request.values.get("Body", "").strip()
     user_name = request.values.get("ProfileName", "User").capitalize()
-    logger.info(f"Received from {sender_number} ({user_name}): {incoming_msg}")
-
-    # Log incoming message
-    conn.execute(
-        "INSERT INTO chats (user_name, phone_number, message, is_bot, timestamp) VALUES (?, ?, ?, ?, ?)",
-        (user_name, sender_number, incoming_msg, 0, datetime.now().isoformat())
-    )
-    conn.commit()
-
-    # Handle teacher responses
-    if sender_number == TEACHER_NUMBER.replace("whatsapp:", ""):
-        return handle_teacher_response(incoming_msg, sender_number)
-
-    # Handle student booking requests
-    booking_details = extract_booking_details(incoming_msg)
-    if booking_details:
-        return handle_booking_request(user_name, sender_number, incoming_msg, booking_details)
-
-    # Handle non-booking messages with LLM
-    return handle_regular_message(user_name, sender_number, incoming_msg)
-
-def handle_teacher_response(incoming_msg: str, sender_number: str):
-    """Process messages from the teacher"""
-    # Teacher confirming a booking
-    if "yes" in incoming_msg.lower():
-        confirmation_match = re.search(r'yes (\d{4}-\d{2}-\d{2}) (\d{2}:\d{2})', incoming_msg.lower())
-        if confirmation_match:
-            date_str, time_str = confirmation_match.groups()
-            
-            # Find matching pending request
-            cursor.execute("""
-                SELECT temp_booking_details FROM chats 
-                WHERE temp_booking_details LIKE ? 
-                AND is_bot = 2
-                ORDER BY timestamp DESC LIMIT 1
-            """, (f'%"date":"{date_str}","time":"{time_str}%',))
-            
-            result = cursor.fetchone()
-            if result:
-                booking_details = json.loads(result[0])
-                if booking_details.get('status') == 'pending_teacher_approval':
-                    # Update status to awaiting email
-                    booking_details['status'] = 'awaiting_email'
-                    conn.execute("""
-                        UPDATE chats SET temp_booking_details = ?
-                        WHERE timestamp = (
-                            SELECT timestamp FROM chats 
-                            WHERE temp_booking_details LIKE ?
-                            AND is_bot = 2
-                            ORDER BY timestamp DESC LIMIT 1
+    # Tie every log line and timing span for this message to its Twilio SID
+    Metrics.request_id.set(request.values.get("MessageSid") or f"local-{uuid.uuid4().hex[:12]}")
+    # Every date worked out for this message uses the same "now"
+    TimeUtils.start_request_clock()
+    logger.info(f"[{Metrics.request_id.get()}] Received from {sender_number} ({user_name}): {incoming_msg}")
+
+    handler = "regular"
+    started = time.perf_counter()
+    try:
+        # Log incoming message
+        with span("db_insert"):
+            storage.log_message(user_name, sender_number, incoming_msg, 0)
+
+        # Handle teacher responses
+        teacher = teachers.by_number(sender_number)
+        if teacher:
+            handler = "teacher"
+            return handle_teacher_response(incoming_msg, teacher)
+
+        # Handle student booking requests
+        with span("intent_extraction"):
+            booking_details = extract_booking_details(incoming_msg)
+        if booking_details:
+            handler = "booking"
+            return handle_booking_request(user_name, sender_number, incoming_msg, booking_details)
+
+        # Handle non-booking messages with LLM
+        return handle_regular_message(user_name, sender_number, incoming_msg)
+    finally:
+        Metrics.REQUEST_SECONDS.observe(handler, time.perf_counter() - started)
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Stage latency histograms in Prometheus text format"""
+    return Response(Metrics.render(), mimetype="text/plain; version=0.0.4")
+
+def handle_teacher_response(incoming_msg: str, teacher: Teacher):
+    """Process messages from a teacher"""
+    text = incoming_msg.lower()
+    # Teacher accepting a booking; the first teacher to say yes gets it
+    if "yes" in text:
+        booking_id = find_teacher_booking(teacher, text)
+        if booking_id:
+            result = storage.find_booking('pending_teacher_approval', booking_id=booking_id)
+            if result and storage.claim_booking(booking_id, teacher.number):
+                key, booking_details = result
+                # Update status to awaiting email
+                booking_details.update(status='awaiting_email', teacher=teacher.name, teacher_number=teacher.number)
+                storage.update_booking(key, booking_details, expected_status='pending_teacher_approval')
+                send_message(teacher.whatsapp, f"What's the student's email to send a calendar invite? ({booking_id})")
+                
+                # Let the other teachers know they don't need to answer
+                for number, status in storage.booking_teachers(booking_id).items():
+                    if status == 'taken':
+                        notify_pool.submit(
+                            send_message, f"whatsapp:{number}", f"Booking {booking_id} was taken by {teacher.name}, no need to reply."
                         )
-                    """, (json.dumps(booking_details), f'%"date":"{date_str}","time":"{time_str}%'))
-                    conn.commit()
-                    
-                    reply = "What's the student's email to send a calendar invite?"
-                    send_message(TEACHER_NUMBER, reply)
-                    return str(MessagingResponse())
+            else:
+                send_message(teacher.whatsapp, f"Thanks! Booking {booking_id} has already been taken by another teacher.")
+        else:
+            send_message(teacher.whatsapp, "That booking has already been taken or is no longer pending.")
+        return str(MessagingResponse())
+    
+    # Teacher declining; the booking is only declined once every teacher has
+    elif re.match(r'\s*no\b', text):
+        booking_id = find_teacher_booking(teacher, text)
+        if booking_id:
+            storage.set_teacher_request(booking_id, teacher.number, 'declined')
+            answers = storage.booking_teachers(booking_id)
+            result = storage.find_booking('pending_teacher_approval', booking_id=booking_id)
+            if result and all(status == 'declined' for status in answers.values()):
+                key, booking_details = result
+                booking_details['status'] = 'declined'
+                if storage.update_booking(key, booking_details, expected_status='pending_teacher_approval'):
+                    holds.release(booking_details.get('hold_id'))
+                    student_reply = (
+                        f"Hi {booking_details['user_name']}, sorry, no teacher can make "
+                        f"{booking_details['date']} at {booking_details['time']}. Let's pick another time."
+                    )
+                    send_message(f"whatsapp:{booking_details['user_number']}", student_reply)
+        else:
+            send_message(teacher.whatsapp, "That booking has already been taken or is no longer pending.")
+        return str(MessagingResponse())
     
     # Teacher providing student email
     elif re.search(r'[\w\.-]+@[\w\.-]+', incoming_msg):
-        # Find the most recent booking awaiting email
-        cursor.execute("""
-            SELECT temp_booking_details FROM chats 
-            WHERE temp_booking_details LIKE '%"status":"awaiting_email"%'
-            AND is_bot = 2
-            ORDER BY timestamp DESC LIMIT 1
-        """)
-        result = cursor.fetchone()
+        # Find this teacher's most recent booking awaiting email
+        result = None
+        for booking_id in storage.teacher_requests(teacher.number, 'accepted'):
+            result = storage.find_booking('awaiting_email', booking_id=booking_id)
+            if result:
+                break
         
         if result:
-            booking_details = json.loads(result[0])
+            key, booking_details = result
             student_email = re.search(r'[\w\.-]+@[\w\.-]+', incoming_msg).group(0)
             
             # Complete the booking
@@ -311,94 +375,129 @@ def handle_teacher_response(incoming_msg: str, sender_number: str):
             user_name = booking_details['user_name']
             user_number = booking_details['user_number']
             
-            end_hour = int(time_str.split(':')[0]) + 1
-            end_time = f"{end_hour:02d}:{time_str.split(':')[1]}"
+            # Claim the booking first, so two email replies arriving together
+            # can't both create a calendar event
+            booking_details['status'] = 'scheduling'
+            if not storage.update_booking(key, booking_details, expected_status='awaiting_email'):
+                return str(MessagingResponse())
             
-            check = check_availability(time_str, end_time, date_str)
+            hold_id = booking_details.get('hold_id')
+            with span("availability_check"):
+                check = check_availability(time_str, LESSON_MINUTES, style, date_str, holds=holds, existing_hold=hold_id)
             if check['is_free']:
-                booking_result = book_class(
-                    check['start'], 
-                    check['end'], 
+                booking_result = schedule_event(
+                    time_str, 
+                    LESSON_MINUTES, 
                     style, 
                     user_name, 
-                    "Chris", 
-                    student_email
+                    teacher.name, 
+                    student_email, 
+                    teacher.email or TEACHER_EMAIL, 
+                    unique_code=hold_id, 
+                    date_str=date_str
                 )
-                
-                # Update status to booked
-                booking_details['status'] = 'booked'
-                booking_details['student_email'] = student_email
-                conn.execute("""
-                    UPDATE chats SET temp_booking_details = ?
-                    WHERE timestamp = (
-                        SELECT timestamp FROM chats 
-                        WHERE temp_booking_details LIKE '%"status":"awaiting_email"%'
-                        AND is_bot = 2
-                        ORDER BY timestamp DESC LIMIT 1
-                    )
-                """, (json.dumps(booking_details),))
-                conn.commit()
-                
-                # Notify student
-                student_reply = f"Hi {user_name}, your booking is confirmed! Invite sent to {student_email}."
-                send_message(f"whatsapp:{user_number}", student_reply)
+                if booking_result['success']:
+                    # The calendar event now occupies the room
+                    holds.release(hold_id)
+                    slot_map.refresh_day_async(date_str)
+                    
+                    # Update status to booked
+                    booking_details['status'] = 'booked'
+                    booking_details['student_email'] = student_email
+                    storage.update_booking(key, booking_details, expected_status='scheduling')
+                    
+                    # Notify student
+                    student_reply = f"Hi {user_name}, your booking is confirmed! Invite sent to {student_email}."
+                    send_message(f"whatsapp:{user_number}", student_reply)
+                else:
+                    # Keep the hold and wait for the email again, so a retry can still book the room
+                    booking_details['status'] = 'awaiting_email'
+                    storage.update_booking(key, booking_details, expected_status='scheduling')
+                    send_message(teacher.whatsapp, f"Couldn't create the calendar event for {booking_details.get('booking_id', key)}. Please send the student's email again.")
+                    student_reply = f"Hi {user_name}, we're having trouble finalising your booking. We'll confirm shortly."
+                    send_message(f"whatsapp:{user_number}", student_reply)
             else:
+                holds.release(hold_id)
+                booking_details['status'] = 'unavailable'
+                storage.update_booking(key, booking_details, expected_status='scheduling')
                 student_reply = f"Hi {user_name}, sorry, that slot's no longer available. Let's pick another time."
                 send_message(f"whatsapp:{user_number}", student_reply)
             
             return str(MessagingResponse())
     
     # Default response for unrecognized teacher messages
-    send_message(TEACHER_NUMBER, "I didn't understand that. Please reply with 'yes DATE TIME' or provide a student email.")
+    send_message(teacher.whatsapp, "I didn't understand that. Please reply with 'YES <booking>', 'NO <booking>' or provide a student email.")
     return str(MessagingResponse())
 
 def handle_booking_request(user_name: str, sender_number: str, incoming_msg: str, booking_details: dict):
     """Process booking requests from students"""
     # Check availability
-    end_hour = int(booking_details['time'].split(':')[0]) + 1
-    end_time = f"{end_hour:02d}:{booking_details['time'].split(':')[1]}"
-    check = check_availability(booking_details['time'], end_time, booking_details['date'])
+    with span("availability_check"):
+        check = check_availability(
+            booking_details['time'], LESSON_MINUTES, booking_details['style'], booking_details['date'],
+            holds=holds, hold_owner=sender_number
+        )
     
+    eligible = []
     if check['is_free']:
+        # Teachers for this style who are free then
+        with span("teacher_routing"):
+            try:
+                eligible = teachers.route(booking_details['style'], check['start'], check['end'])
+            except Exception as e:
+                logger.error(f"Teacher availability check failed, asking everyone for the style: {e}")
+                eligible = [t for t in teachers.teachers if t.teaches(booking_details['style'])]
+        if not eligible:
+            holds.release(check['hold_id'])
+    
+    if eligible:
         # Store booking request
         full_booking_details = {
             **booking_details,
             'user_name': user_name,
-            'user_number': sender_number
+            'user_number': sender_number,
+            'hold_id': check['hold_id'],
+            'booking_id': check['hold_id'] or str(uuid.uuid4())[:8]
         }
         
-        conn.execute("""
-            INSERT INTO chats 
-            (user_name, phone_number, message, is_bot, timestamp, temp_booking_details) 
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (
+        storage.add_booking_request(
             user_name, 
             sender_number, 
             f"Booking request: {booking_details['style']} on {booking_details['date']} at {booking_details['time']}", 
-            2,  # Flag for booking request
-            datetime.now().isoformat(),
-            json.dumps(full_booking_details)
-        ))
-        conn.commit()
+            full_booking_details
+        )
+        storage.add_teacher_requests(full_booking_details['booking_id'], [t.number for t in eligible])
         
-        # Notify teacher
-        if not notify_teacher(full_booking_details):
-            # Store failed notification
-            conn.execute("""
-                INSERT INTO pending_notifications 
-                (teacher_number, message, timestamp)
-                VALUES (?, ?, ?)
-            """, (TEACHER_NUMBER, json.dumps(full_booking_details), datetime.now().isoformat()))
-            conn.commit()
+        # Notify all eligible teachers at once
+        notify_teachers(eligible, full_booking_details)
         
         # Reply to student
         reply = (
             f"Hi {user_name}, I've sent your {booking_details['style']} class request "
-            f"for {booking_details['date']} at {booking_details['time']} to the teacher. "
+            f"for {booking_details['date']} at {booking_details['time']} to "
+            f"{'the teacher' if len(eligible) == 1 else 'our teachers'}. "
             f"I'll get back to you soon with confirmation!"
         )
+    elif check['is_free']:
+        reply = (
+            f"Hi {user_name}, sorry, none of our {booking_details['style']} teachers are free "
+            f"on {booking_details['date']} at {booking_details['time']}. Please suggest another time."
+        )
     else:
-        reply = f"Hi {user_name}, sorry, that time slot is already taken. Please suggest another time."
+        with span("slot_suggestions"):
+            try:
+                requested = TimeUtils.localize(booking_details['date'], booking_details['time'])
+            except ValueError:
+                requested = TimeUtils.now()
+            suggestions = slot_map.suggest(requested, LESSON_MINUTES)
+        if suggestions:
+            reply = (
+                f"Hi {user_name}, sorry, that time slot is already taken. These times are open:\n"
+                f"{format_slots(suggestions)}\n"
+                f"Which one works for you?"
+            )
+        else:
+            reply = f"Hi {user_name}, sorry, that time slot is already taken. Please suggest another time."
     
     send_message(f"whatsapp:{sender_number}", reply)
     log_bot_message(user_name, sender_number, reply)
@@ -406,13 +505,50 @@ def handle_booking_request(user_name: str, sender_number: str, incoming_msg: str
 
 def handle_regular_message(user_name: str, sender_number: str, incoming_msg: str):
     """Handle non-booking related messages"""
+    snapshot = knowledge.current()
+    
+    # Common fact sheet questions get an instant templated answer, and
+    # "when are you free?" one from the slot map
+    with span("fast_path"):
+        reply, intent = snapshot.fast_path.answer(incoming_msg, user_name)
+        if reply is None and asks_availability(incoming_msg):
+            slots = slot_map.upcoming(LESSON_MINUTES)
+            if slots:
+                intent = "availability"
+                reply = (
+                    f"Hi {user_name}! These are the next open times for a {LESSON_MINUTES}-minute private class:\n"
+                    f"{format_slots(slots)}\n"
+                    f"Tell me the day, style and time you'd like, e.g. \"Friday salsa at 10am\"."
+                )
+    Metrics.FAST_PATH_TOTAL.inc(intent)
+    if reply is not None:
+        logger.info(f"[{Metrics.request_id.get()}] Answered from fact sheet ({intent})")
+        send_message(f"whatsapp:{sender_number}", reply)
+        log_bot_message(user_name, sender_number, reply)
+        return str(MessagingResponse())
+    
+    # Load chat history
+    with span("db_history"):
+        rows = storage.history(sender_number, 10)
+    
+    history = []
+    for row in reversed(rows):  # Reverse to maintain chronological order
+        history.append(HumanMessage(content=row[0]) if row[1] == 0 else AIMessage(content=row[0]))
+    
+    # Only the fact sheet chunks relevant to this question (and the one before it) go into the prompt
+    with span("retrieval"):
+        asked = [m.content for m in history if isinstance(m, HumanMessage)]
+        previous = asked[-2] if len(asked) > 1 else ""  # asked[-1] is this message, logged by the webhook
+        chunks = knowledge.relevant_chunks(f"{incoming_msg} {previous}", RAG_TOP_K, snapshot)
+        context = "\n".join(f"- {chunk.text}" for chunk in chunks)
+    
     # Updated system prompt
     system_prompt = SystemMessage(
     content=(
         f"Hi, thanks for reaching out to us at Majao. We’re here to assist with class options, scheduling, or any dance-related questions "
         f"you have. Our responses are clear, professional, and welcoming—think of us as your guide to everything Majao.\n\n"
 
-        f"Here’s the full rundown:\n{json.dumps(fact_sheet, indent=2)}\n\n"
+        f"Here’s what’s relevant from our fact sheet (v{snapshot.version}):\n{context}\n\n"
 
         f"We aim to make this easy and helpful. When responding:\n"
         f"- We’ll use your name if you share it.\n"
@@ -420,24 +556,13 @@ def handle_regular_message(user_name: str, sender_number: str, incoming_msg: str
         f"- We’ll stay professional but warm—no slang or over-the-top casual stuff.\n"
         f"- For private lessons, we’ll ask about your goals and availability to find the best fit.\n"
         f"- For scheduling, we’ll suggest times and confirm what works for you. If they request multiple classes, ask about other preferred dates/times to book together.\n"
-        f"- We’ll keep it concise—no fluff, just what you need. Only mention payment (cash or Bancolombia transfers) if they ask or refer to it.\n\n"
+        f"- We’ll keep it concise—no fluff, just what you need. Only mention payment (cash or Bancolombia transfers) if they ask or refer to it.\n"
+        f"- If the answer isn’t in the notes above, we’ll say we’ll check with the team rather than guess.\n\n"
 
         f"What can we help you with today?"
     )
 )
     
-    # Load chat history
-    cursor.execute("""
-        SELECT message, is_bot FROM chats 
-        WHERE phone_number = ? 
-        ORDER BY timestamp DESC 
-        LIMIT 10
-    """, (sender_number,))
-    
-    history = []
-    for row in reversed(cursor.fetchall()):  # Reverse to maintain chronological order
-        history.append(HumanMessage(content=row[0]) if row[1] == 0 else AIMessage(content=row[0]))
-    
     messages = [system_prompt] + history + [HumanMessage(content=incoming_msg)]
     reply = llm._call(messages)
     
@@ -452,12 +577,13 @@ def handle_regular_message(user_name: str, sender_number: str, incoming_msg: str
 def send_message(to: str, body: str) -> bool:
     """Send message with error handling"""
     try:
-        message = twilio_client.messages.create(
-            body=body,
-            from_=TWILIO_WHATSAPP_NUMBER,
-            to=to
-        )
-        logger.info(f"Message sent to {to}, SID: {message.sid}")
+        with span("twilio_send"):
+            message = twilio_client.messages.create(
+                body=body,
+                from_=TWILIO_WHATSAPP_NUMBER,
+                to=to
+            )
+        logger.info(f"[{Metrics.request_id.get()}] Message sent to {to}, SID: {message.sid}")
         return True
     except Exception as e:
         logger.error(f"Failed to send to {to}: {str(e)}")
@@ -465,11 +591,8 @@ def send_message(to: str, body: str) -> bool:
 
 def log_bot_message(user_name: str, phone_number: str, message: str):
     """Log bot responses to database"""
-    conn.execute(
-        "INSERT INTO chats (user_name, phone_number, message, is_bot, timestamp) VALUES (?, ?, ?, ?, ?)",
-        (user_name, phone_number, message, 1, datetime.now().isoformat())
-    )
-    conn.commit()
+    with span("db_log"):
+        storage.log_message(user_name, phone_number, message, 1)
 
 if __name__ == "__main__":
     logger.info("Starting MajaoBot with Twilio WhatsApp API...")
@@ -0,0 +1,148 @@
+import os
+import logging
+import time
+import threading
+from datetime import datetime, timedelta, timezone
+import httplib2
+import google_auth_httplib2
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import InstalledAppFlow
+from googleapiclient.discovery import build
+
+# Shared Google API clients for Booking, Analytics and Chat.
+# One set of credentials is loaded per token file and kept fresh by a
+# background thread; each thread gets its own service object on top of it
+# because httplib2 (and therefore a built service) is not thread-safe.
+
+logger = logging.getLogger(__name__)
+
+SCOPES = ['https://www.googleapis.com/auth/calendar']
+REFRESH_MARGIN = timedelta(minutes=5)  # Refresh tokens this long before they expire
+REFRESH_CHECK_SECONDS = 60
+
+_lock = threading.Lock()
+_clients = {}  # (credentials_file, token_file, scopes) -> _SharedCredentials
+_refresher = None
+_transport_factory = None  # Offline stand-in for Google, see set_transport_factory
+_generation = 0  # Bumped to invalidate every thread's cached services
+_local = threading.local()
+
+def set_transport_factory(factory):
+    """Serve every client from `factory()` instead of Google.
+
+    `factory` must return an httplib2-compatible object, e.g.
+    googleapiclient.http.HttpMockSequence for offline tests. No credentials are
+    loaded while it is set. Pass None to go back to the real API.
+    """
+    global _transport_factory, _generation
+    with _lock:
+        _transport_factory = factory
+        _clients.clear()
+        _generation += 1
+
+def load_credentials(credentials_file, token_file, scopes=SCOPES, interactive=True, oauth_port=0):
+    """Load the saved token, refreshing it or running the OAuth flow if needed."""
+    creds = None
+    if os.path.exists(token_file):
+        logger.debug(f"Loading existing token from {token_file}")
+        creds = Credentials.from_authorized_user_file(token_file, scopes)
+    if creds and not creds.valid and creds.refresh_token:
+        try:
+            creds.refresh(Request())
+            _save_token(creds, token_file)
+        except Exception as e:
+            logger.warning(f"Token refresh failed, falling back to OAuth flow: {e}")
+    if not creds or not creds.valid:
+        if not interactive:
+            raise RuntimeError(f"No valid Google token at {token_file} and interactive login is disabled; "
+                               f"log in from a terminal to create one")
+        if not os.path.exists(credentials_file):
+            raise FileNotFoundError(f"Credentials file not found at {credentials_file}")
+        logger.info(f"No valid creds found, initiating OAuth flow with {credentials_file}")
+        flow = InstalledAppFlow.from_client_secrets_file(credentials_file, scopes)
+        creds = flow.run_local_server(port=oauth_port)
+        _save_token(creds, token_file)
+    return creds
+
+def _save_token(creds, token_file):
+    with open(token_file, 'w') as token:
+        token.write(creds.to_json())
+
+class _SharedCredentials:
+    """Credentials for one token file plus the lock that guards refreshing them."""
+
+    def __init__(self, credentials_file, token_file, scopes, interactive, oauth_port):
+        self.token_file = token_file
+        self.creds = load_credentials(credentials_file, token_file, scopes, interactive, oauth_port)
+        self.lock = threading.Lock()
+
+    def needs_refresh(self):
+        expiry = self.creds.expiry  # naive UTC
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return expiry is not None and expiry - now < REFRESH_MARGIN
+
+    def refresh(self):
+        with self.lock:
+            if not self.needs_refresh():
+                return
+            self.creds.refresh(Request())
+            _save_token(self.creds, self.token_file)
+            logger.info(f"Refreshed Google token {self.token_file}, valid until {self.creds.expiry} UTC")
+
+def _refresh_loop():
+    while True:
+        time.sleep(REFRESH_CHECK_SECONDS)
+        with _lock:
+            shared = list(_clients.values())
+        for entry in shared:
+            try:
+                entry.refresh()
+            except Exception as e:
+                logger.error(f"Background token refresh failed for {entry.token_file}: {e}")
+
+def _start_refresher():
+    global _refresher
+    if _refresher is None:
+        _refresher = threading.Thread(target=_refresh_loop, name="google-token-refresh", daemon=True)
+        _refresher.start()
+
+def _shared_credentials(key, credentials_file, token_file, scopes, interactive, oauth_port):
+    with _lock:
+        entry = _clients.get(key)
+    if entry is not None:
+        return entry
+    # Loaded outside the lock: a token refresh or OAuth flow must not stall
+    # every other thread asking for a client. If two threads race here, the
+    # first one to finish wins and the other's credentials are dropped.
+    loaded = _SharedCredentials(credentials_file, token_file, scopes, interactive, oauth_port)
+    with _lock:
+        entry = _clients.setdefault(key, loaded)
+        _start_refresher()
+    return entry
+
+def get_service(api, version, credentials_file, token_file, scopes=SCOPES, interactive=True, oauth_port=0):
+    """Return this thread's cached `api` client for the given credential set."""
+    key = (api, version, credentials_file, token_file, tuple(scopes))
+    if getattr(_local, 'generation', None) != _generation:
+        _local.services = {}
+        _local.generation = _generation
+    services = _local.services
+    service = services.get(key)
+    if service is not None:
+        return service
+
+    if _transport_factory is not None:
+        service = build(api, version, http=_transport_factory(), static_discovery=True)
+    else:
+        entry = _shared_credentials(key[2:], credentials_file, token_file, scopes, interactive, oauth_port)
+        if entry.needs_refresh():
+            entry.refresh()
+        http = google_auth_httplib2.AuthorizedHttp(entry.creds, http=httplib2.Http())
+        service = build(api, version, http=http, static_discovery=True)
+    services[key] = service
+    return service
+
+def get_calendar_service(credentials_file, token_file, **kwargs):
+    """Return this thread's cached Google Calendar v3 client."""
+    return get_service('calendar', 'v3', credentials_file, token_file, **kwargs)
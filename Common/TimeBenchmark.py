@@ -0,0 +1,89 @@
+import sys
+import random
+import timeit
+import argparse
+from datetime import datetime, timedelta
+import pytz
+from Majao_Bot_Modules.Common import TimeUtils
+
+# Microbenchmarks for Common/TimeUtils.py against the per-call code it replaced.
+#
+#   python -m Majao_Bot_Modules.Common.TimeBenchmark [--busy 300] [--repeat 5]
+#
+# Each line shows the best of --repeat runs, per operation.
+
+def old_occupancy(busy, start, end):
+    """The previous OccupancyIndex.occupancy: linear scan over datetime tuples."""
+    changes = []
+    for busy_start, busy_end, _ in [b for b in busy if b[0] < end and b[1] > start]:
+        changes.append((max(busy_start, start), 1))
+        changes.append((min(busy_end, end), -1))
+    peak = current = 0
+    for _, change in sorted(changes):
+        current += change
+        peak = max(peak, current)
+    return peak
+
+def make_busy(count, rng):
+    """Freebusy-style blocks spread over the next two weeks of opening hours."""
+    day = TimeUtils.TZ.localize(datetime(2025, 3, 3))
+    blocks = []
+    for _ in range(count):
+        start = day + timedelta(days=rng.randrange(14), hours=8 + rng.randrange(18) / 2)
+        end = start + timedelta(minutes=rng.choice((60, 90, 120)))
+        blocks.append({
+            'start': start.astimezone(pytz.UTC).isoformat().replace('+00:00', 'Z'),
+            'end': end.astimezone(pytz.UTC).isoformat().replace('+00:00', 'Z'),
+        })
+    return day, blocks
+
+def bench(stmt, number, repeat):
+    return min(timeit.repeat(stmt, number=number, repeat=repeat)) / number
+
+def main():
+    parser = argparse.ArgumentParser(description="Time utility microbenchmarks")
+    parser.add_argument('--busy', type=int, default=300, help="busy blocks in the occupancy benchmarks")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    rng = random.Random(1)
+    day, blocks = make_busy(args.busy, rng)
+
+    old_busy = sorted(
+        (datetime.fromisoformat(b['start'].replace('Z', '+00:00')).astimezone(TimeUtils.TZ),
+         datetime.fromisoformat(b['end'].replace('Z', '+00:00')).astimezone(TimeUtils.TZ), 'cal')
+        for b in blocks
+    )
+    index = TimeUtils.IntervalIndex(TimeUtils.parse_busy(b, 'cal') for b in blocks)
+    slots = [(day + timedelta(days=3, hours=8, minutes=30 * i), day + timedelta(days=3, hours=9, minutes=30 * i))
+             for i in range(18)]
+    TimeUtils.start_request_clock()
+
+    cases = [
+        ("timezone lookup", 100000,
+         lambda: pytz.timezone('America/Bogota'),
+         lambda: TimeUtils.TZ),
+        ("'now' x3 per message", 100000,
+         lambda: (datetime.now(pytz.timezone('America/Bogota')), datetime.now(pytz.timezone('America/Bogota')),
+                  datetime.now(pytz.timezone('America/Bogota'))),
+         lambda: (TimeUtils.now(), TimeUtils.now(), TimeUtils.now())),
+        (f"parse {len(blocks)} freebusy blocks", 50,
+         lambda: [(datetime.fromisoformat(b['start'].replace('Z', '+00:00')).astimezone(TimeUtils.TZ),
+                   datetime.fromisoformat(b['end'].replace('Z', '+00:00')).astimezone(TimeUtils.TZ)) for b in blocks],
+         lambda: [TimeUtils.parse_busy(b) for b in blocks]),
+        ("occupancy, one slot", 2000,
+         lambda: old_occupancy(old_busy, *slots[4]),
+         lambda: index.peak(slots[4][0].timestamp(), slots[4][1].timestamp())),
+        ("alternative-slot scan, one day", 200,
+         lambda: [old_occupancy(old_busy, s, e) for s, e in slots],
+         lambda: [index.peak(s.timestamp(), e.timestamp()) for s, e in slots]),
+    ]
+
+    print(f"{'benchmark':<34} {'before':>12} {'after':>12} {'speedup':>9}")
+    for name, number, before, after in cases:
+        t_before = bench(before, number, args.repeat)
+        t_after = bench(after, number, args.repeat)
+        print(f"{name:<34} {t_before * 1e6:>10.2f}us {t_after * 1e6:>10.2f}us {t_before / t_after:>8.1f}x")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
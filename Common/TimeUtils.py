@@ -0,0 +1,98 @@
+from bisect import bisect_left
+from collections import namedtuple
+from contextvars import ContextVar
+from datetime import datetime
+from functools import lru_cache
+from typing import Iterable, List, Optional
+import pytz
+
+# Time handling shared by booking, chat and analytics:
+#  - one Bogotá timezone object instead of pytz.timezone() on every call
+#  - Google timestamps decoded once into an EventTime record (datetimes for
+#    display plus epoch seconds for arithmetic)
+#  - a "now" that stays fixed for the whole webhook request
+#  - an interval index over epoch seconds for overlap and occupancy math
+#
+# Microbenchmarks against the old per-call code: python -m Majao_Bot_Modules.Common.TimeBenchmark
+
+TZ = pytz.timezone('America/Bogota')
+UTC = pytz.UTC
+
+EventTime = namedtuple("EventTime", ["start", "end", "source", "start_ts", "end_ts"])
+
+_request_now = ContextVar("request_now", default=None)
+
+@lru_cache(maxsize=8192)
+def parse_iso(value: str, tz=TZ) -> datetime:
+    """Google/ISO-8601 timestamp (a trailing 'Z' is fine) as an aware datetime in `tz`."""
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).astimezone(tz)
+
+def event_time(start: datetime, end: datetime, source=None) -> EventTime:
+    return EventTime(start, end, source, start.timestamp(), end.timestamp())
+
+def parse_event(event: dict, source=None) -> Optional[EventTime]:
+    """Start and end of a Calendar API event, or None for all-day events."""
+    start, end = event['start'].get('dateTime'), event['end'].get('dateTime')
+    if not start or not end:
+        return None
+    return event_time(parse_iso(start), parse_iso(end), source)
+
+def parse_busy(block: dict, source=None) -> EventTime:
+    """One {'start', 'end'} block from a freebusy response."""
+    return event_time(parse_iso(block['start']), parse_iso(block['end']), source)
+
+def now() -> datetime:
+    """Current Bogotá time, fixed for the request once start_request_clock() ran."""
+    return _request_now.get() or datetime.now(TZ)
+
+def start_request_clock() -> datetime:
+    """Freeze now() for the rest of the current request (context)."""
+    value = datetime.now(TZ)
+    _request_now.set(value)
+    return value
+
+def localize(date_str: str, time_str: str) -> datetime:
+    """'YYYY-MM-DD' and 'HH:MM' as an aware Bogotá datetime."""
+    return TZ.localize(datetime.strptime(f"{date_str} {time_str}", '%Y-%m-%d %H:%M'))
+
+class IntervalIndex:
+    """EventTimes kept sorted by start epoch, with bisect-based overlap queries.
+
+    Queries only look at intervals that start within the longest interval's
+    length before the window, instead of scanning the whole list.
+    """
+
+    def __init__(self, intervals: Iterable[EventTime] = ()):
+        self.intervals = sorted(intervals, key=lambda e: e.start_ts)
+        self.starts = [e.start_ts for e in self.intervals]
+        self.max_length = max((e.end_ts - e.start_ts for e in self.intervals), default=0.0)
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def __iter__(self):
+        return iter(self.intervals)
+
+    def add(self, interval: EventTime):
+        i = bisect_left(self.starts, interval.start_ts)
+        self.starts.insert(i, interval.start_ts)
+        self.intervals.insert(i, interval)
+        self.max_length = max(self.max_length, interval.end_ts - interval.start_ts)
+
+    def overlapping(self, start_ts: float, end_ts: float) -> List[EventTime]:
+        """Intervals overlapping [start_ts, end_ts)."""
+        lo = bisect_left(self.starts, start_ts - self.max_length)
+        hi = bisect_left(self.starts, end_ts)
+        return [e for e in self.intervals[lo:hi] if e.end_ts > start_ts]
+
+    def peak(self, start_ts: float, end_ts: float) -> int:
+        """Most intervals in progress at any moment within [start_ts, end_ts)."""
+        changes = []
+        for e in self.overlapping(start_ts, end_ts):
+            changes.append((max(e.start_ts, start_ts), 1))
+            changes.append((min(e.end_ts, end_ts), -1))
+        peak = current = 0
+        for _, change in sorted(changes):  # ends (-1) sort before starts at the same instant
+            current += change
+            peak = max(peak, current)
+        return peak
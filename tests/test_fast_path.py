@@ -0,0 +1,51 @@
+import json
+import os
+import pytest
+from Majao_Bot_Modules.Chat.FastPath import FastPathIndex, asks_availability
+
+FACT_SHEET = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Chat", "fact_sheet.json")
+
+@pytest.fixture(scope="module")
+def fast_path():
+    with open(FACT_SHEET, encoding="utf-8") as f:
+        return FastPathIndex(json.load(f)["fact_sheet"])
+
+@pytest.mark.parametrize("message, intent", [
+    ("How much is a private class?", "pricing"),
+    ("cuanto cuesta una clase privada", "pricing"),
+    ("Where is the studio?", "location"),
+    ("whats the address", "location"),
+    ("donde queda el estudio", "location"),
+    ("Is there a social this Wednesday?", "social"),
+    ("What day is zouk?", "style_day"),
+    ("When are the group classes?", "group_days"),
+    ("horario de clases grupales", "group_days"),
+    ("When is the next bootcamp?", "intensives"),
+    ("Tell me about the bootcamps", "intensives"),
+])
+def test_answers_clear_questions(fast_path, message, intent):
+    reply, matched = fast_path.answer(message, "Ana")
+    assert matched == intent
+    assert reply.startswith("Hi Ana! ")
+
+@pytest.mark.parametrize("message", [
+    "how much is the group class?",
+    "Do you rent the studio, what are the rates?",
+    "I cant make it, where do I get a refund?",
+    "Is the social cancelled tonight?",
+    "where do I park?",
+    "How much is a class?",
+    "Can I schedule a private class?",
+    "what is the schedule for private classes",
+    "horario de clases privadas?",
+    "Can I book a group class?",
+    "How does MAJAO approach social dancing?",
+    "Do I need a partner for the social?",
+    "Are bootcamps good for beginners?",
+])
+def test_leaves_other_questions_to_the_llm(fast_path, message):
+    assert fast_path.answer(message) == (None, "llm")
+
+def test_availability_questions():
+    assert asks_availability("When are you free this week?")
+    assert not asks_availability("Can I reschedule, when are you free?")
@@ -0,0 +1,105 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+import pytest
+import requests
+from langchain_core.language_models import SimpleChatModel
+from langchain_core.messages import HumanMessage
+from Majao_Bot_Modules.Chat import MockServices
+from Majao_Bot_Modules.Chat.LLMRouter import LLMProvider, LLMRouter
+
+# Failover, circuit breaking, hedging and slot waiting against local
+# OpenAI-compatible mocks with configurable latency and error rate.
+
+MESSAGES = [HumanMessage(content="hi")]
+
+class MockChat(SimpleChatModel):
+    url: str
+
+    def _call(self, messages: List, stop: Optional[List[str]] = None, **kwargs) -> str:
+        response = requests.post(f"{self.url}/v1/chat/completions", json={"messages": [{"content": "hi"}]}, timeout=10)
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"]
+
+    @property
+    def _llm_type(self) -> str:
+        return "mock"
+
+@pytest.fixture
+def services():
+    started = []
+
+    def start(name, **kwargs):
+        service = MockServices.deepseek_service(name=name, **kwargs).start()
+        started.append(service)
+        return service
+
+    yield start
+    for service in started:
+        service.stop()
+
+def provider(service, **kwargs):
+    return LLMProvider(service.name, MockChat(url=service.url), **kwargs)
+
+def test_errors_fall_over_to_the_next_provider(services):
+    primary, fallback = services("primary", error_rate=1.0), services("fallback")
+    router = LLMRouter(providers=[provider(primary), provider(fallback)])
+    assert router._call(MESSAGES).startswith("Mock answer")
+    assert (primary.requests, fallback.requests) == (1, 1)
+
+def test_all_providers_failing_gives_the_fallback_reply(services):
+    primary, fallback = services("primary", error_rate=1.0), services("fallback", error_rate=1.0)
+    router = LLMRouter(providers=[provider(primary), provider(fallback)])
+    assert router._call(MESSAGES) == router.fallback_reply
+
+def test_breaker_opens_then_probes_after_the_cooldown(services):
+    primary, fallback = services("primary", error_rate=1.0), services("fallback")
+    first = provider(primary, failure_threshold=2, reset_seconds=0.3)
+    router = LLMRouter(providers=[first, provider(fallback)])
+
+    router._call(MESSAGES)
+    assert not first.breaker.is_open
+    router._call(MESSAGES)
+    assert first.breaker.is_open
+
+    # Open: the primary is skipped entirely
+    router._call(MESSAGES)
+    assert primary.requests == 2
+
+    # After the cooldown one probe goes through, and a success closes the breaker
+    time.sleep(0.35)
+    primary.error_rate = 0.0
+    router._call(MESSAGES)
+    assert primary.requests == 3
+    assert not first.breaker.is_open and first.breaker.failures == 0
+
+def test_hedges_to_the_next_provider_after_the_delay(services):
+    primary, fallback = services("primary", latency_ms=1000), services("fallback")
+    router = LLMRouter(providers=[provider(primary), provider(fallback)], default_hedge_seconds=0.2, min_hedge_seconds=0.2)
+    start = time.perf_counter()
+    router._call(MESSAGES)
+    elapsed = time.perf_counter() - start
+    assert fallback.requests == 1
+    assert 0.2 <= elapsed < 0.8
+
+def test_no_hedge_when_the_leader_answers_in_time(services):
+    primary, fallback = services("primary", latency_ms=50), services("fallback")
+    router = LLMRouter(providers=[provider(primary), provider(fallback)], default_hedge_seconds=0.5)
+    router._call(MESSAGES)
+    assert (primary.requests, fallback.requests) == (1, 0)
+
+def test_last_provider_waits_for_a_free_slot(services):
+    only = services("deepseek", latency_ms=100)
+    router = LLMRouter(providers=[provider(only, max_concurrency=2)])
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        replies = list(pool.map(lambda _: router._call(MESSAGES), range(5)))
+    assert router.fallback_reply not in replies
+    assert only.requests == 5
+
+def test_full_provider_with_a_fallback_fails_fast(services):
+    primary, fallback = services("primary", latency_ms=300), services("fallback")
+    router = LLMRouter(providers=[provider(primary, max_concurrency=1), provider(fallback)], default_hedge_seconds=5)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        replies = list(pool.map(lambda _: router._call(MESSAGES), range(2)))
+    assert router.fallback_reply not in replies
+    assert (primary.requests, fallback.requests) == (1, 1)
@@ -0,0 +1,93 @@
+import threading
+from datetime import timedelta
+from types import SimpleNamespace
+import pytest
+from Majao_Bot_Modules.Booking import CalendarScript, Reservations
+from Majao_Bot_Modules.Booking.Reservations import HoldStore
+from Majao_Bot_Modules.Chat import MockServices
+from Majao_Bot_Modules.Common import GoogleClient, TimeUtils
+
+# Slot holds: concurrent webhooks must never hold more rooms than there are.
+
+ROOMS = 2
+START = TimeUtils.localize("2030-01-07", "10:00")
+END = START + timedelta(hours=1)
+
+def fits(active):
+    return len(active) < ROOMS
+
+def acquire_concurrently(stores, attempts=16):
+    barrier = threading.Barrier(attempts)
+    results = []
+
+    def attempt(i):
+        barrier.wait()
+        results.append(stores[i % len(stores)].acquire(START, END, f"student{i}", fits))
+
+    threads = [threading.Thread(target=attempt, args=(i,)) for i in range(attempts)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return [hold_id for hold_id in results if hold_id]
+
+def test_concurrent_acquire_never_exceeds_capacity(tmp_path):
+    store = HoldStore(str(tmp_path / "holds.db"))
+    assert len(acquire_concurrently([store])) == ROOMS
+    assert len(store.active(START, END)) == ROOMS
+
+def test_separate_connections_share_the_limit(tmp_path):
+    # Two stores on one file, like two worker processes
+    stores = [HoldStore(str(tmp_path / "holds.db")), HoldStore(str(tmp_path / "holds.db"))]
+    assert len(acquire_concurrently(stores)) == ROOMS
+    assert len(stores[1].active(START, END)) == ROOMS
+
+def test_acquire_if_only_matches_the_expected_holds(tmp_path):
+    store = HoldStore(str(tmp_path / "holds.db"))
+    first = store.acquire_if(START, END, "a", [])
+    assert first
+    assert store.acquire_if(START, END, "b", []) is None
+    assert store.acquire_if(START, END, "b", [first])
+
+def test_release_and_expiry(tmp_path, monkeypatch):
+    clock = [1_000_000.0]
+    monkeypatch.setattr(Reservations, "time", SimpleNamespace(time=lambda: clock[0]))
+    store = HoldStore(str(tmp_path / "holds.db"), ttl_minutes=10)
+    first = store.acquire(START, END, "a", fits)
+    store.acquire(START, END, "b", fits)
+    assert store.acquire(START, END, "c", fits) is None
+
+    store.release(first)
+    assert store.acquire(START, END, "c", fits)
+    assert store.acquire(START, END, "d", fits) is None
+
+    clock[0] += 10 * 60 + 1
+    assert store.active(START, END) == []
+    assert store.acquire(START, END, "d", fits)
+
+@pytest.fixture
+def free_calendar():
+    google = MockServices.google_calendar_service(busy_probability=0).start()
+    GoogleClient.set_transport_factory(lambda: MockServices.RedirectingHttp(google.url))
+    yield
+    GoogleClient.set_transport_factory(None)
+    google.stop()
+
+def test_existing_hold_is_not_counted_against_its_owner(tmp_path, free_calendar):
+    store = HoldStore(str(tmp_path / "holds.db"))
+    own = store.acquire(START, END, "student", fits)
+    store.acquire(START, END, "other", fits)
+
+    check = CalendarScript.check_availability("10:00", 60, "salsa", "2030-01-07", holds=store)
+    assert not check["is_free"]
+    check = CalendarScript.check_availability("10:00", 60, "salsa", "2030-01-07", holds=store, existing_hold=own)
+    assert check["is_free"]
+
+def test_check_availability_holds_the_last_room_once(tmp_path, free_calendar):
+    store = HoldStore(str(tmp_path / "holds.db"))
+    checks = [
+        CalendarScript.check_availability("10:00", 60, "salsa", "2030-01-07", holds=store, hold_owner=f"student{i}")
+        for i in range(3)
+    ]
+    assert [check["is_free"] for check in checks] == [True, True, False]
+    assert checks[0]["hold_id"] != checks[1]["hold_id"]
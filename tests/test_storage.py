@@ -0,0 +1,125 @@
+import threading
+from datetime import timedelta
+import pytest
+import requests
+from Majao_Bot_Modules.Chat.Storage import HttpStorage, SqliteStorage
+from Majao_Bot_Modules.Chat.StorageServer import StorageServer
+from Majao_Bot_Modules.Common import TimeUtils
+
+# SqliteStorage and HttpStorage (through a StorageServer on an ephemeral
+# port) must behave the same for every operation the webhook uses.
+
+START = TimeUtils.localize("2030-01-07", "10:00")
+END = START + timedelta(hours=1)
+
+def serve(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+@pytest.fixture
+def server(tmp_path):
+    server = serve(StorageServer(str(tmp_path / "server.db")))
+    yield server
+    server.shutdown()
+
+@pytest.fixture
+def backends(tmp_path, server):
+    return {"sqlite": SqliteStorage(str(tmp_path / "local.db")), "http": HttpStorage(server.url)}
+
+def booking_scenario(storage):
+    """Every storage call the webhook makes, returning what a caller would see."""
+    seen = []
+    storage.log_message("Ana", "+57300", "hello", 0)
+    storage.log_message("Ana", "+57300", "hi Ana", 1)
+    seen.append(storage.history("+57300"))
+
+    details = {"style": "salsa", "date": "2030-01-07", "time": "10:00", "status": "pending_teacher_approval",
+               "booking_id": "abcd1234"}
+    key = storage.add_booking_request("Ana", "+57300", "Booking request", details)
+    seen.append(storage.find_booking("pending_teacher_approval")[1])
+    seen.append(storage.find_booking("pending_teacher_approval", "2030-01-07", "10:00")[1])
+    seen.append(storage.find_booking("pending_teacher_approval", booking_id="ffff0000"))
+
+    storage.add_teacher_requests("abcd1234", ["+571", "+572", "+573"])
+    seen.append(storage.teacher_requests("+571", "pending"))
+    storage.set_teacher_request("abcd1234", "+573", "declined")
+    seen.append(storage.claim_booking("abcd1234", "+572"))
+    seen.append(storage.claim_booking("abcd1234", "+571"))
+    seen.append(storage.booking_teachers("abcd1234"))
+    seen.append(storage.teacher_requests("+572", "accepted"))
+
+    accepted = dict(details, status="awaiting_email")
+    seen.append(storage.update_booking(key, accepted, expected_status="pending_teacher_approval"))
+    seen.append(storage.update_booking(key, accepted, expected_status="pending_teacher_approval"))
+    seen.append(storage.find_booking("awaiting_email", booking_id="abcd1234")[1])
+    seen.append(storage.update_booking(key, dict(accepted, status="booked")))
+    seen.append(storage.find_booking("booked")[1])
+
+    storage.add_pending_notification("+571", "{}")
+    return seen
+
+def test_backends_agree(backends):
+    local, remote = booking_scenario(backends["sqlite"]), booking_scenario(backends["http"])
+    assert local == remote
+    # Spot-check the results themselves, not just that they match
+    assert local[5:7] == [True, False]  # claim_booking: first accept wins
+    assert local[7] == {"+571": "taken", "+572": "accepted", "+573": "declined"}
+    assert local[9:11] == [True, False]  # update_booking only while still in expected_status
+
+def test_holds_over_http_never_exceed_capacity(server):
+    holds = HttpStorage(server.url).hold_store(180)
+    barrier = threading.Barrier(8)
+    won = []
+
+    def attempt(i):
+        barrier.wait()
+        won.append(holds.acquire(START, END, f"student{i}", lambda active: len(active) < 2))
+
+    threads = [threading.Thread(target=attempt, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len([hold_id for hold_id in won if hold_id]) == 2
+    assert len(server.holds.active(START, END)) == 2
+
+def test_hold_acquire_retries_after_losing_a_race(server, monkeypatch):
+    storage = HttpStorage(server.url)
+    holds = storage.hold_store(180)
+    real_call, calls = storage._call, []
+
+    def racing_call(method, **kwargs):
+        if method == "hold_acquire_if":
+            calls.append(kwargs["expected"])
+            if len(calls) == 1:
+                # Another worker takes a room between our read and our insert
+                server.holds.acquire(START, END, "other", lambda active: True)
+        return real_call(method, **kwargs)
+
+    monkeypatch.setattr(storage, "_call", racing_call)
+    assert holds.acquire(START, END, "student", lambda active: len(active) < 2)
+    assert len(calls) == 2 and calls[0] == [] and len(calls[1]) == 1
+    assert holds.acquire(START, END, "late", lambda active: len(active) < 2) is None
+
+def test_release_over_http(server):
+    holds = HttpStorage(server.url).hold_store(180)
+    hold_id = holds.acquire(START, END, "student", lambda active: True)
+    assert [hold[0] for hold in holds.active(START, END)] == [hold_id]
+    holds.release(hold_id)
+    assert holds.active(START, END) == []
+
+def test_non_loopback_bind_needs_a_token(tmp_path):
+    with pytest.raises(ValueError):
+        StorageServer(str(tmp_path / "server.db"), host="0.0.0.0")
+
+def test_wrong_or_missing_token_is_rejected(tmp_path):
+    server = serve(StorageServer(str(tmp_path / "server.db"), host="0.0.0.0", token="s3cret"))
+    url = f"http://127.0.0.1:{server.server.server_address[1]}"
+    try:
+        for token in (None, "wrong"):
+            with pytest.raises(requests.HTTPError) as error:
+                HttpStorage(url, token=token).history("+57300")
+            assert error.value.response.status_code == 401
+        assert HttpStorage(url, token="s3cret").history("+57300") == []
+    finally:
+        server.shutdown()
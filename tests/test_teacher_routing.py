@@ -0,0 +1,131 @@
+import json
+import os
+from datetime import timedelta
+import pytest
+from Majao_Bot_Modules.Chat import LoadTest, MockServices
+from Majao_Bot_Modules.Chat.Storage import SqliteStorage
+
+# Booking fan-out and the teacher YES/NO state machine, through the webhook.
+# Google Calendar goes through GoogleClient's fake transport to an always-free
+# mock; teacher notifications and replies are recorded instead of sent.
+
+ANA, BEN, CAL = "+570000000001", "+570000000002", "+570000000003"
+STUDENT, OTHER_STUDENT = "+573001112233", "+573009998877"
+
+TEACHERS = {"teachers": [
+    {"name": "Ana", "number": ANA, "email": "ana@example.com", "styles": ["salsa"], "calendar_id": None},
+    {"name": "Ben", "number": BEN, "email": None, "styles": ["*"], "calendar_id": None},
+    {"name": "Cal", "number": CAL, "email": None, "styles": ["bachata"], "calendar_id": None},
+]}
+
+@pytest.fixture(scope="module")
+def chat(tmp_path_factory):
+    path = tmp_path_factory.mktemp("chat")
+    with open(path / "teachers.json", "w") as f:
+        json.dump(TEACHERS, f)
+    os.environ.update({"TEACHERS_PATH": str(path / "teachers.json"), "CHAT_MAINTENANCE_HOUR": "", "SLOT_MAP_HOUR": ""})
+    mocks = {
+        "deepseek": MockServices.deepseek_service().start(),
+        "fallback": MockServices.deepseek_service(name="fallback").start(),
+        "twilio": MockServices.twilio_service().start(),
+        "google": MockServices.google_calendar_service(busy_probability=0).start(),
+    }
+    yield LoadTest.load_chat(mocks, str(path / "conversations.db"))
+    for mock in mocks.values():
+        mock.stop()
+
+@pytest.fixture
+def webhook(chat, tmp_path, monkeypatch):
+    """Post to the webhook against a fresh database; returns (post, notified, sent)."""
+    storage = SqliteStorage(str(tmp_path / "conversations.db"))
+    monkeypatch.setattr(chat, "storage", storage)
+    monkeypatch.setattr(chat, "holds", storage.hold_store(180))
+    notified, sent = [], []
+    monkeypatch.setattr(chat, "notify_teacher", lambda teacher, details: notified.append(teacher.name) or True)
+    monkeypatch.setattr(chat, "send_message", lambda to, body: sent.append((to.replace("whatsapp:", ""), body)))
+    client = chat.app.test_client()
+    counter = iter(range(10**6))
+
+    def post(sender, body):
+        form = {"From": f"whatsapp:{sender}", "Body": body, "ProfileName": "test", "MessageSid": f"SMtest{next(counter)}"}
+        assert client.post("/webhook", data=form).status_code == 200
+
+    return post, notified, sent
+
+def request_booking(chat, post, student, hour):
+    post(student, f"Can I book tomorrow salsa at {hour}")
+    key, details = chat.storage.find_booking("pending_teacher_approval")
+    assert details["user_number"] == student
+    return details["booking_id"]
+
+def test_request_goes_to_every_eligible_teacher(chat, webhook):
+    post, notified, _ = webhook
+    booking_id = request_booking(chat, post, STUDENT, "3pm")
+    assert sorted(notified) == ["Ana", "Ben"]
+    assert chat.storage.booking_teachers(booking_id) == {ANA: "pending", BEN: "pending"}
+
+def test_first_yes_wins(chat, webhook):
+    post, _, sent = webhook
+    booking_id = request_booking(chat, post, STUDENT, "3pm")
+    post(ANA, f"YES {booking_id}")
+    post(BEN, f"YES {booking_id}")
+
+    assert chat.storage.booking_teachers(booking_id) == {ANA: "accepted", BEN: "taken"}
+    _, details = chat.storage.find_booking("awaiting_email", booking_id=booking_id)
+    assert details["teacher"] == "Ana"
+    assert any(to == BEN and "no longer pending" in body for to, body in sent)
+
+def test_declined_only_when_every_teacher_declines(chat, webhook):
+    post, _, sent = webhook
+    booking_id = request_booking(chat, post, STUDENT, "3pm")
+    post(ANA, "no")
+    assert chat.storage.find_booking("pending_teacher_approval", booking_id=booking_id)
+    assert not any("no teacher can make" in body for _, body in sent)
+
+    post(BEN, f"NO {booking_id}")
+    assert chat.storage.find_booking("declined", booking_id=booking_id)
+    assert any(to == STUDENT and "no teacher can make" in body for to, body in sent)
+
+def test_stale_booking_id_never_touches_another_booking(chat, webhook):
+    post, _, _ = webhook
+    first = request_booking(chat, post, STUDENT, "3pm")
+    post(ANA, f"YES {first}")
+    second = request_booking(chat, post, OTHER_STUDENT, "4pm")
+
+    # Ben hasn't seen that the first booking was taken
+    post(BEN, f"YES {first}")
+    post(BEN, f"NO {first}")
+    assert chat.storage.booking_teachers(second) == {ANA: "pending", BEN: "pending"}
+    assert chat.storage.find_booking("pending_teacher_approval", booking_id=second)
+
+    # A reply that names nothing still means the teacher's latest request
+    post(BEN, "yes")
+    assert chat.storage.booking_teachers(second) == {ANA: "taken", BEN: "accepted"}
+
+def accept_and_send_email(chat, post, monkeypatch, results):
+    calls = []
+    monkeypatch.setattr(chat, "schedule_event", lambda *args, **kwargs: calls.append(args) or results.pop(0))
+    booking_id = request_booking(chat, post, STUDENT, "3pm")
+    post(ANA, f"YES {booking_id}")
+    post(ANA, "student@example.com")
+    return booking_id, calls
+
+def test_email_books_the_class(chat, webhook, monkeypatch):
+    post, _, sent = webhook
+    booking_id, calls = accept_and_send_email(chat, post, monkeypatch, [{"success": True, "event_id": "e1"}])
+    _, details = chat.storage.find_booking("booked", booking_id=booking_id)
+    assert details["student_email"] == "student@example.com"
+    assert any(to == STUDENT and "confirmed" in body for to, body in sent)
+
+    # A second email for the same booking doesn't create another event
+    post(ANA, "student@example.com")
+    assert len(calls) == 1
+
+def test_failed_calendar_insert_keeps_the_hold(chat, webhook, monkeypatch):
+    post, _, sent = webhook
+    booking_id, _ = accept_and_send_email(chat, post, monkeypatch, [{"success": False, "error": "boom"}])
+    _, details = chat.storage.find_booking("awaiting_email", booking_id=booking_id)
+    assert not any("confirmed" in body for _, body in sent)
+    assert any(to == ANA and "Couldn't create the calendar event" in body for to, body in sent)
+    start = chat.TimeUtils.localize(details["date"], details["time"])
+    assert [hold[0] for hold in chat.holds.active(start, start + timedelta(minutes=1))] == [details["hold_id"]]